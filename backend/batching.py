@@ -0,0 +1,218 @@
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+# Submission priorities; lower runs first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+
+class Overloaded(Exception):
+    """Raised at submit time when a model's queue cannot take more work."""
+
+    def __init__(self, name, reason, retry_after, status_code):
+        super().__init__(f"{name}: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class _Pending:
+    __slots__ = ("item", "key", "priority", "future", "enqueued_at")
+
+    def __init__(self, item, key, priority):
+        self.item = item
+        self.key = key
+        self.priority = priority
+        self.future = Future()
+        # Set by MicroBatcher.abandon once nobody will read the result
+        self.future.abandoned = False
+        self.enqueued_at = time.monotonic()
+
+
+class MicroBatcher:
+    """
+    Coalesce requests for one model into batches on a dedicated worker thread.
+
+    A batch is dispatched once `max_batch_size` items with the same key are
+    waiting or the oldest item has waited `max_wait_ms`. Items with different
+    keys (e.g. different decoding parameters) are never mixed in one batch.
+    Items also carry a priority: the next batch is always formed from the
+    most urgent priority waiting, so BACKGROUND work only runs while no
+    INTERACTIVE item is queued, and the two are never mixed in one batch.
+    `batch_fn(items, key, timings, abandoned)` must return one result per
+    item and may fill `timings` with per-stage measurements; long-running
+    batch functions should poll `abandoned()`, which turns true once every
+    item of the batch has been abandoned, and stop early. Each future gets a `timings`
+    attribute (those measurements plus its own queue wait) before it resolves,
+    and the optional `observer(name, batch_size, queue_waits, timings)` hook is
+    called once per completed batch.
+
+    Admission control: a submission is rejected with `Overloaded` when
+    `max_queue` items are already waiting (429) or when the estimated wait
+    for the current backlog exceeds `latency_budget_ms` (503). The estimate
+    is the number of batches ahead times a moving average of batch duration.
+    Both only count items at the submission's priority or more urgent, so
+    queued background work never causes an interactive request to be rejected.
+    """
+
+    def __init__(
+        self, name, batch_fn, max_batch_size=8, max_wait_ms=10, max_queue=0, latency_budget_ms=0, observer=None
+    ):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.observer = observer
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_queue = max_queue
+        self.latency_budget = latency_budget_ms / 1000
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._busy = False
+        self._avg_batch_seconds = None
+        self._avg_seconds_by_key = {}
+
+    def submit(self, item, key=None, priority=INTERACTIVE):
+        return self.submit_many([item], key, priority)[0]
+
+    def submit_many(self, items, key=None, priority=INTERACTIVE):
+        if not items:
+            # Nothing to queue, e.g. every input was cached or joined a flight; never rejected
+            return []
+        pending = [_Pending(item, key, priority) for item in items]
+        with self._cond:
+            self._admit(priority)
+            self._ensure_worker()
+            self._pending.extend(pending)
+            self._cond.notify()
+        return [p.future for p in pending]
+
+    def abandon(self, future):
+        """
+        Give up on a submitted item whose caller went away: it is dropped if
+        still queued, otherwise its batch may stop early once all of its items
+        are abandoned. Its result, if any, must not be used.
+        """
+        future.abandoned = True
+        if future.cancel():
+            with self._cond:
+                self._pending = deque(p for p in self._pending if p.future is not future)
+
+    def queue_depth(self, priority=None):
+        """Items waiting; with `priority`, only those at that priority or more urgent."""
+        if priority is None:
+            return len(self._pending)
+        return sum(1 for p in list(self._pending) if p.priority <= priority)
+
+    def expected_wait(self, priority=INTERACTIVE):
+        """Seconds until a newly queued item of `priority` would start running, based on recent batch durations."""
+        if self._avg_batch_seconds is None:
+            return 0.0
+        batches_ahead = math.ceil(self.queue_depth(priority) / self.max_batch_size) + (1 if self._busy else 0)
+        return batches_ahead * self._avg_batch_seconds
+
+    def batch_seconds(self, key=None):
+        """Moving average of how long a batch with this key takes, or None if none has run yet."""
+        return self._avg_seconds_by_key.get(key)
+
+    def _admit(self, priority):
+        # Caller holds self._cond. Large submissions are admitted whole once there is room,
+        # so batch endpoints are never rejected just for being larger than the queue.
+        if self.max_queue and self.queue_depth(priority) >= self.max_queue:
+            raise Overloaded(self.name, "queue is full", self._retry_after(priority), 429)
+        if self.latency_budget:
+            wait = self.expected_wait(priority)
+            if wait > self.latency_budget:
+                retry_after = self._retry_after(priority, wait)
+                raise Overloaded(self.name, "expected wait exceeds latency budget", retry_after, 503)
+
+    def _retry_after(self, priority, wait=None):
+        wait = self.expected_wait(priority) if wait is None else wait
+        return max(1, math.ceil(wait))
+
+    def _ensure_worker(self):
+        # Started lazily so the thread is created in the process that serves requests
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=f"batcher-{self.name}", daemon=True)
+            self._thread.start()
+
+    def _head(self):
+        # Oldest item of the most urgent priority waiting
+        return min(self._pending, key=lambda p: p.priority)
+
+    def _count_key(self, key, priority):
+        count = 0
+        for p in self._pending:
+            if p.key == key and p.priority == priority:
+                count += 1
+                if count >= self.max_batch_size:
+                    break
+        return count
+
+    def _take_batch(self):
+        with self._cond:
+            while True:
+                # abandon() may have emptied the queue while this thread waited out the batch window
+                while not self._pending:
+                    self._cond.wait()
+                # Re-picked after every wakeup, so an interactive arrival overtakes waiting background work
+                head = self._head()
+                key, priority = head.key, head.priority
+                if self._count_key(key, priority) >= self.max_batch_size:
+                    break
+                remaining = head.enqueued_at + self.max_wait - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch, rest = [], deque()
+            while self._pending:
+                p = self._pending.popleft()
+                if p.key == key and p.priority == priority and len(batch) < self.max_batch_size:
+                    batch.append(p)
+                else:
+                    rest.append(p)
+            self._pending = rest
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            batch = [p for p in batch if p.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            self._busy = True
+            started = time.monotonic()
+            timings = {}
+            abandoned = lambda: all(p.future.abandoned for p in batch)
+            try:
+                results = self.batch_fn([p.item for p in batch], batch[0].key, timings, abandoned)
+            except Exception as e:
+                logging.exception(f"Batch of {len(batch)} failed in {self.name}")
+                for p in batch:
+                    p.future.set_exception(e)
+                continue
+            finally:
+                self._busy = False
+                self._record_duration(batch[0].key, time.monotonic() - started)
+            queue_waits = [started - p.enqueued_at for p in batch]
+            for p, queue_wait, result in zip(batch, queue_waits, results):
+                p.future.timings = {**timings, "queue_wait": queue_wait}
+                p.future.set_result(result)
+            if self.observer is not None:
+                try:
+                    self.observer(self.name, len(batch), queue_waits, timings)
+                except Exception:
+                    logging.exception(f"Batch observer failed in {self.name}")
+
+    def _record_duration(self, key, seconds):
+        self._avg_batch_seconds = _ewma(self._avg_batch_seconds, seconds)
+        self._avg_seconds_by_key[key] = _ewma(self._avg_seconds_by_key.get(key), seconds)
+
+
+def _ewma(average, value, weight=0.2):
+    return value if average is None else (1 - weight) * average + weight * value
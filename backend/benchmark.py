@@ -0,0 +1,240 @@
+"""
+Load-test the API on CPU without the real checkpoints.
+
+    python benchmark.py make-models --output ./models/tiny
+    python benchmark.py run --lengths 32 128 512 --concurrency 1 8 32
+
+`make-models` builds a tiny, randomly initialized BERT token classifier and
+T5 seq2seq model with a locally generated WordPiece vocabulary, saved in the
+same layout as the real checkpoints so `AutoTokenizer` / `AutoModel*` load
+them unchanged. Nothing is downloaded.
+
+`run` starts `uvicorn main:app` against those checkpoints (any serving
+option such as TAG_BATCH_SIZE or INFERENCE_BACKEND is passed through from
+the environment), or targets an already running server with --url, then
+sends concurrent load to /generate_keywords and /generate_tags and reports
+throughput and p50/p95/p99 latency per input length and concurrency level.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+SPECIAL_TOKENS = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+WORDS = (
+    "pemerintah program energi baru nasional ekonomi pendidikan kesehatan teknologi digital data analisis "
+    "penelitian metode hasil sistem informasi masyarakat daerah kota desa pembangunan infrastruktur jalan "
+    "transportasi politik pemilu presiden menteri kebijakan hukum pengadilan olahraga sepak bola musik film "
+    "budaya wisata lingkungan iklim hutan air pertanian pangan harga pasar bank investasi saham perusahaan "
+    "pekerja industri produksi ekspor impor mahasiswa universitas sekolah guru siswa rumah sakit dokter "
+    "penyakit vaksin model jaringan saraf pembelajaran mesin klasifikasi teks kata kunci tag berita artikel"
+).split()
+
+
+def make_models(args):
+    import torch
+    from transformers import (
+        BertConfig,
+        BertForTokenClassification,
+        BertTokenizerFast,
+        T5Config,
+        T5ForConditionalGeneration,
+    )
+
+    torch.manual_seed(args.seed)
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+
+    # Whole words, plus single characters and ## pieces so any text tokenizes without [UNK] storms
+    characters = sorted(set("abcdefghijklmnopqrstuvwxyz0123456789"))
+    vocab = SPECIAL_TOKENS + list(",.:;-") + characters + [f"##{c}" for c in characters] + sorted(set(WORDS))
+    vocab_file = output / "vocab.txt"
+    vocab_file.write_text("\n".join(vocab) + "\n", encoding="utf-8")
+    tokenizer = BertTokenizerFast(vocab_file=str(vocab_file), do_lower_case=True)
+    pad_id, sep_id = tokenizer.pad_token_id, tokenizer.sep_token_id
+
+    keyword_dir = output / "best_keyword_model"
+    keyword_model = BertForTokenClassification(
+        BertConfig(
+            vocab_size=len(vocab),
+            hidden_size=args.hidden_size,
+            num_hidden_layers=args.layers,
+            num_attention_heads=2,
+            intermediate_size=args.hidden_size * 2,
+            max_position_embeddings=512,
+            num_labels=3,
+            id2label={0: "O", 1: "B-KEY", 2: "I-KEY"},
+            label2id={"O": 0, "B-KEY": 1, "I-KEY": 2},
+        )
+    )
+    keyword_model.save_pretrained(keyword_dir)
+    tokenizer.save_pretrained(keyword_dir)
+
+    tag_dir = output / "best_tag_model"
+    tag_model = T5ForConditionalGeneration(
+        T5Config(
+            vocab_size=len(vocab),
+            d_model=args.hidden_size,
+            d_kv=args.hidden_size // 2,
+            d_ff=args.hidden_size * 2,
+            num_layers=args.layers,
+            num_decoder_layers=args.layers,
+            num_heads=2,
+            pad_token_id=pad_id,
+            eos_token_id=sep_id,
+            decoder_start_token_id=pad_id,
+        )
+    )
+    tag_model.save_pretrained(tag_dir)
+    tokenizer.save_pretrained(tag_dir)
+    print(f"[INFO] Model kecil disimpan ke {keyword_dir} dan {tag_dir}")
+
+
+def make_text(length, rng):
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_level(url, endpoint, length, concurrency, total, rng):
+    # Unique texts so the result cache does not hide inference cost
+    payloads = [{"text": make_text(length, rng)} for _ in range(total)]
+    local = threading.local()
+
+    def send(payload):
+        # One keep-alive session per client thread
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        session = local.session
+        start = time.perf_counter()
+        degraded = False
+        try:
+            response = session.post(f"{url}{endpoint}", json=payload, timeout=120)
+            status = response.status_code
+            # A 200 answered by the statistical fallback says nothing about model latency
+            degraded = status == 200 and response.json().get("degraded", False)
+        except (requests.RequestException, ValueError):
+            status = None
+        return status, degraded, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        outcomes = list(pool.map(send, payloads))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(seconds * 1000 for status, degraded, seconds in outcomes if status == 200 and not degraded)
+    return {
+        "endpoint": endpoint,
+        "length": length,
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "degraded": sum(degraded for _, degraded, _ in outcomes),
+        "rejected": sum(status in (429, 503) for status, _, _ in outcomes),
+        "failed": sum(status not in (200, 429, 503) for status, _, _ in outcomes),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+    }
+
+
+def start_server(args):
+    env = dict(os.environ)
+    env.setdefault("KEYWORD_MODEL_PATH", str(Path(args.models) / "best_keyword_model"))
+    env.setdefault("TAG_MODEL_PATH", str(Path(args.models) / "best_tag_model"))
+    # Overload should show up as rejections, not as fast fallback answers
+    env.setdefault("FALLBACK_INDEX_DIR", "")
+    # Only unconstrained requests are sent, so skip loading a trie that may belong to another tag model
+    env.setdefault("TAG_TRIE_PATH", "")
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"]
+    if args.workers > 1:
+        command += ["--workers", str(args.workers)]
+    return subprocess.Popen(command, cwd=Path(__file__).resolve().parent, env=env)
+
+
+def wait_ready(url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{url}/health/ready", timeout=2).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def run(args):
+    url = args.url or f"http://127.0.0.1:{args.port}"
+    server = None if args.url else start_server(args)
+    try:
+        if not wait_ready(url, args.startup_timeout):
+            print(f"[ERROR] Server di {url} tidak siap dalam {args.startup_timeout} detik.")
+            return
+        rng = random.Random(args.seed)
+        rows = []
+        header = f"{'endpoint':20} {'len':>5} {'conc':>5} {'ok':>5} {'deg':>5} {'rej':>5} {'fail':>5} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}"
+        print(header)
+        for endpoint in args.endpoints:
+            for length in args.lengths:
+                for concurrency in args.concurrency:
+                    row = run_level(url, endpoint, length, concurrency, args.requests, rng)
+                    rows.append(row)
+                    print(
+                        f"{endpoint:20} {length:5} {concurrency:5} {row['ok']:5} {row['degraded']:5} {row['rejected']:5} {row['failed']:5} "
+                        f"{row['throughput_rps']:8} {row['p50_ms']:8} {row['p95_ms']:8} {row['p99_ms']:8}"
+                    )
+        if args.output:
+            Path(args.output).write_text(json.dumps(rows, indent=2), encoding="utf-8")
+            print(f"[INFO] Hasil disimpan ke {args.output}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API dengan model kecil lokal.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    models_parser = subparsers.add_parser("make-models", help="Buat checkpoint kecil acak")
+    models_parser.add_argument("--output", default="./models/tiny")
+    models_parser.add_argument("--hidden-size", type=int, default=64)
+    models_parser.add_argument("--layers", type=int, default=2)
+    models_parser.add_argument("--seed", type=int, default=0)
+
+    run_parser = subparsers.add_parser("run", help="Jalankan beban konkuren ke API")
+    run_parser.add_argument("--models", default="./models/tiny")
+    run_parser.add_argument("--url", default=None, help="Gunakan server yang sudah berjalan")
+    run_parser.add_argument("--port", type=int, default=8765)
+    run_parser.add_argument("--workers", type=int, default=1)
+    run_parser.add_argument("--endpoints", nargs="+", default=["/generate_keywords", "/generate_tags"])
+    run_parser.add_argument("--lengths", nargs="+", type=int, default=[32, 128, 512], help="Panjang input (kata)")
+    run_parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    run_parser.add_argument("--requests", type=int, default=64, help="Request per level")
+    run_parser.add_argument("--startup-timeout", type=float, default=120)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--output", default=None, help="Simpan hasil sebagai JSON")
+
+    args = parser.parse_args()
+    if args.command == "make-models":
+        make_models(args)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
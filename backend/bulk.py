@@ -0,0 +1,244 @@
+"""
+Offline bulk inference over the processed datasets (the output of
+`save_csv_processed`), without going through the HTTP API.
+
+    python bulk.py keyword --workers 4
+    python bulk.py tag --input "../data/processed/kompas.csv" --profile fast
+
+Rows are streamed from the CSVs, grouped into length buckets so each batch
+pads tightly, and run across worker processes. Results are appended to
+JSONL shards in the output directory as batches finish. Every row is
+identified by a hash of its text, the model version and the decoding
+parameters; rerunning the same command skips rows already present in the
+shards, so an interrupted run resumes where it stopped. Rows with identical
+text are computed once; every other row with that text gets a copy of the
+result, written after the run's new results.
+"""
+import argparse
+import glob
+import json
+import logging
+import multiprocessing
+import os
+from collections import deque
+from pathlib import Path
+
+import pandas as pd
+
+from cache import make_key, model_fingerprint
+from config import (
+    KEYWORD_MODEL_PATH,
+    TAG_MODEL_PATH,
+    MAX_LENGTH,
+    KEYWORD_WINDOW_STRIDE,
+    TAG_DECODING_PROFILES,
+    TAG_DEFAULT_PROFILE,
+)
+from inference import length_sorted, extract_keywords, generate_tag_lists
+from jobs import row_text
+from models import load_keyword_model, load_tag_model, configure_torch_threads, model_variant
+
+# Per-process state for pool workers
+_worker = {}
+
+
+def task_params(args):
+    if args.task == "keyword":
+        params = {"max_length": MAX_LENGTH, "sliding_window": args.sliding_window, "decoding": "offsets"}
+        if args.sliding_window:
+            params["stride"] = KEYWORD_WINDOW_STRIDE
+        return params
+    return TAG_DECODING_PROFILES[args.profile]
+
+
+def task_version(args):
+    path = KEYWORD_MODEL_PATH if args.task == "keyword" else TAG_MODEL_PATH
+    return f"{model_fingerprint(path)}-{model_variant('torch', args.quantize)}"
+
+
+def init_worker(task, quantize, threads):
+    configure_torch_threads(threads)
+    if task == "keyword":
+        _worker["tokenizer"], _worker["model"] = load_keyword_model(KEYWORD_MODEL_PATH, quantize=quantize)
+    else:
+        _worker["tokenizer"], _worker["model"] = load_tag_model(TAG_MODEL_PATH, quantize=quantize)
+
+
+def run_batch(job):
+    task, options, records = job
+    texts = [record["text"] for record in records]
+    if task == "keyword":
+        outputs = extract_keywords(_worker["tokenizer"], _worker["model"], texts, options["sliding_window"])
+    else:
+        tag_lists = generate_tag_lists(_worker["tokenizer"], _worker["model"], texts, generation_params=options["params"])
+        outputs = [{"tags": tags} for tags in tag_lists]
+    return [
+        {"hash": record["hash"], "source": record["source"], "row": record["row"], **output}
+        for record, output in zip(records, outputs)
+    ]
+
+
+def iter_shard_results(output_dir):
+    """Every result line already written; a torn last line from a crash is skipped."""
+    for shard in sorted(Path(output_dir).glob("part-*.jsonl")):
+        with open(shard, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "hash" in result:
+                    yield result
+
+
+def load_done(output_dir):
+    """(source, row, hash) of every row already written."""
+    return {(result["source"], result["row"], result["hash"]) for result in iter_shard_results(output_dir)}
+
+
+def iter_records(args, version, params, done, computed, copies):
+    """
+    Yield the rows still to compute. A row whose text is already in `computed`
+    (row hashes written or queued so far) is appended to `copies` instead.
+    """
+    paths = sorted({path for pattern in args.input for path in glob.glob(pattern)})
+    for path in paths:
+        source = Path(path).stem
+        row_offset = 0
+        for chunk in pd.read_csv(path, chunksize=args.chunk_size):
+            chunk = chunk.fillna("")
+            for i, row in enumerate(chunk.to_dict("records")):
+                text = row_text(args.task, row)
+                if not text.strip():
+                    continue
+                row_hash = make_key(args.task, text, version, params)
+                if (source, row_offset + i, row_hash) in done:
+                    continue
+                record = {"hash": row_hash, "source": source, "row": row_offset + i}
+                if row_hash in computed:
+                    copies.append(record)
+                    continue
+                computed.add(row_hash)
+                yield {**record, "text": text}
+            row_offset += len(chunk)
+
+
+def iter_jobs(args, records, options):
+    """Buffer `bucket_size` rows, sort them by length and cut them into batches."""
+    bucket = []
+    for record in records:
+        bucket.append(record)
+        if len(bucket) >= args.bucket_size:
+            yield from _bucket_jobs(args, bucket, options)
+            bucket = []
+    if bucket:
+        yield from _bucket_jobs(args, bucket, options)
+
+
+def _bucket_jobs(args, bucket, options):
+    ordered = [bucket[i] for i in length_sorted([record["text"] for record in bucket])]
+    for start in range(0, len(ordered), args.batch_size):
+        yield args.task, options, ordered[start:start + args.batch_size]
+
+
+class ShardWriter:
+    """Append results to numbered JSONL shards, starting a new shard every `shard_size` rows."""
+
+    def __init__(self, output_dir, shard_size):
+        self.output_dir = Path(output_dir)
+        self.shard_size = shard_size
+        self.index = len(list(self.output_dir.glob("part-*.jsonl")))
+        self.rows_in_shard = 0
+        self.file = None
+
+    def write(self, results):
+        for result in results:
+            if self.file is None or self.rows_in_shard >= self.shard_size:
+                self._rotate()
+            self.file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            self.rows_in_shard += 1
+        self.file.flush()
+
+    def _rotate(self):
+        if self.file is not None:
+            self.file.close()
+        self.file = open(self.output_dir / f"part-{self.index:05d}.jsonl", "a", encoding="utf-8")
+        self.index += 1
+        self.rows_in_shard = 0
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def write_next(writer, in_flight):
+    results = in_flight.popleft().get()
+    writer.write(results)
+    logging.info(f"{len(results)} baris ditulis ke shard {writer.index - 1:05d}")
+    return len(results)
+
+
+def write_copies(writer, output_dir, copies):
+    """Write the result of each duplicate row in `copies`, read back from the shards its text was written to."""
+    if not copies:
+        return 0
+    wanted = {copy["hash"] for copy in copies}
+    outputs = {}
+    for result in iter_shard_results(output_dir):
+        if result["hash"] in wanted:
+            outputs.setdefault(result["hash"], result)
+    writer.write({**outputs[copy["hash"]], **copy} for copy in copies)
+    logging.info(f"{len(copies)} baris dengan teks duplikat ditulis dari hasil yang sudah ada")
+    return len(copies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk inference kata kunci / tag atas data/processed.")
+    parser.add_argument("task", choices=["keyword", "tag"])
+    parser.add_argument("--input", nargs="+", default=["../data/processed/*.csv"], help="Path atau glob CSV")
+    parser.add_argument("--output-dir", default=None, help="Default: ../data/inference/<task>")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--threads", type=int, default=1, help="Thread torch per worker")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--bucket-size", type=int, default=2048, help="Baris yang diurutkan per bucket panjang")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Baris CSV yang dibaca per chunk")
+    parser.add_argument("--shard-size", type=int, default=50000, help="Baris per shard output")
+    parser.add_argument("--sliding-window", action="store_true", help="Mode sliding window untuk kata kunci")
+    parser.add_argument("--profile", choices=list(TAG_DECODING_PROFILES), default=TAG_DEFAULT_PROFILE)
+    parser.add_argument("--quantize", action="store_true", help="Gunakan model INT8 dinamis")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    output_dir = args.output_dir or f"../data/inference/{args.task}"
+    os.makedirs(output_dir, exist_ok=True)
+
+    version = task_version(args)
+    params = task_params(args)
+    options = {"sliding_window": args.sliding_window, "params": params}
+    done = load_done(output_dir)
+    logging.info(f"{len(done)} baris sudah diproses sebelumnya dan akan dilewati")
+    computed = {row_hash for _, _, row_hash in done}
+    copies = []
+
+    jobs = iter_jobs(args, iter_records(args, version, params, done, computed, copies), options)
+    writer = ShardWriter(output_dir, args.shard_size)
+    processed = 0
+    ctx = multiprocessing.get_context("spawn")
+    try:
+        with ctx.Pool(args.workers, initializer=init_worker, initargs=(args.task, args.quantize, args.threads)) as pool:
+            # Keep only a few batches in flight so memory stays bounded however large the input is
+            in_flight = deque()
+            for job in jobs:
+                in_flight.append(pool.apply_async(run_batch, (job,)))
+                if len(in_flight) >= args.workers * 2:
+                    processed += write_next(writer, in_flight)
+            while in_flight:
+                processed += write_next(writer, in_flight)
+        processed += write_copies(writer, output_dir, copies)
+    finally:
+        writer.close()
+    logging.info(f"Selesai: {processed} baris baru ditulis ke {output_dir}")
+
+
+if __name__ == "__main__":
+    main()
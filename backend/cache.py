@@ -0,0 +1,215 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+# Keyword results carry character offsets into the input and slices of it, so two texts that only
+# differ in whitespace must not share an entry
+RAW_TEXT_NAMESPACES = frozenset({"keyword"})
+
+
+def normalize_text(text):
+    """Collapse whitespace so trivially different resubmissions share a cache entry."""
+    return " ".join(text.split())
+
+
+def make_key(namespace, text, version, params=None):
+    if namespace not in RAW_TEXT_NAMESPACES:
+        text = normalize_text(text)
+    payload = json.dumps(
+        {"ns": namespace, "version": version, "params": params, "text": text},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def model_fingerprint(path):
+    """Identify a checkpoint by its config and weight files so retrained models never hit stale entries."""
+    digest = hashlib.sha256()
+    if not os.path.isdir(path):
+        digest.update(path.encode("utf-8"))
+        return digest.hexdigest()[:16]
+    for name in sorted(os.listdir(path)):
+        file_path = os.path.join(path, name)
+        # Dotfiles are serving-side state (e.g. the ONNX export lock), not part of the checkpoint
+        if name.startswith(".") or not os.path.isfile(file_path):
+            continue
+        stat = os.stat(file_path)
+        digest.update(f"{name}:{stat.st_size}:{int(stat.st_mtime)}".encode("utf-8"))
+        if name == "config.json":
+            with open(file_path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+class ResultCache:
+    """
+    Two-tier result cache: an in-process LRU with TTL, backed by an optional
+    SQLite file that every worker on the host can share.
+
+    The SQLite tier can block for its whole busy timeout while another worker
+    writes, so it never runs on the caller's thread when that is the event
+    loop: `lookup` reads it in a worker thread, and `set` hands entries to a
+    writer thread that commits them in batches.
+    """
+
+    # Bound parameters per SELECT ... IN (...) of the shared tier; older SQLite builds allow 999
+    DISK_BATCH = 500
+
+    def __init__(self, max_entries=10000, ttl_seconds=3600, sqlite_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.sqlite_path = sqlite_path
+        self._db = None
+        self._db_pid = None
+        self._db_lock = threading.Lock()
+        self._writes = None
+        self._writer_pid = None
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+    def _connection(self):
+        # Opened lazily and per process: SQLite connections must not be inherited across fork
+        if self._db is None or self._db_pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.sqlite_path)), exist_ok=True)
+            self._db = sqlite3.connect(self.sqlite_path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._db_pid = os.getpid()
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM results WHERE expires_at < ?", (time.time(),))
+            logging.info(f"Shared result cache opened at {self.sqlite_path}")
+        return self._db
+
+    def get(self, key):
+        """The cached value for `key`, or None. Blocks on the shared tier; use `lookup` on the event loop."""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        """`{key: value}` for the `keys` that are cached. Blocks on the shared tier."""
+        now = time.time()
+        found = self._get_memory(keys, now)
+        missing = [key for key in keys if key not in found]
+        return self._record(found, self._get_disk(missing, now), len(keys), now)
+
+    async def lookup(self, keys):
+        """`get_many` for the event loop: the shared tier is read in a worker thread."""
+        now = time.time()
+        found = self._get_memory(keys, now)
+        missing = [key for key in keys if key not in found]
+        disk = await asyncio.to_thread(self._get_disk, missing, now) if missing and self.sqlite_path else {}
+        return self._record(found, disk, len(keys), now)
+
+    def set(self, key, value):
+        """Cache `value`; the shared tier is written in the background."""
+        expires_at = time.time() + self.ttl
+        self._set_memory(key, value, expires_at)
+        if self.sqlite_path:
+            self._writer().put((key, value, expires_at))
+
+    def _get_memory(self, keys, now):
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._memory.get(key)
+                if entry is None:
+                    continue
+                value, expires_at = entry
+                if expires_at >= now:
+                    self._memory.move_to_end(key)
+                    found[key] = value
+                else:
+                    del self._memory[key]
+        return found
+
+    def _record(self, found, disk, lookups, now):
+        with self._lock:
+            self.hits += len(found) + len(disk)
+            self.disk_hits += len(disk)
+            self.misses += lookups - len(found) - len(disk)
+        for key, value in disk.items():
+            self._set_memory(key, value, now + self.ttl)
+        return {**found, **disk}
+
+    def _set_memory(self, key, value, expires_at):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._memory[key] = (value, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _get_disk(self, keys, now):
+        if not self.sqlite_path or not keys:
+            return {}
+        rows = []
+        try:
+            with self._db_lock:
+                db = self._connection()
+                for i in range(0, len(keys), self.DISK_BATCH):
+                    batch = keys[i:i + self.DISK_BATCH]
+                    rows += db.execute(
+                        f"SELECT key, value FROM results WHERE key IN ({','.join('?' * len(batch))}) AND expires_at >= ?",
+                        (*batch, now),
+                    ).fetchall()
+        except sqlite3.Error as e:
+            logging.warning(f"Failed to read result cache entries from SQLite: {e}")
+            return {}
+        return {key: json.loads(value) for key, value in rows}
+
+    def _writer(self):
+        # Threads do not survive fork either, so every process starts its own writer
+        with self._lock:
+            if self._writer_pid != os.getpid():
+                self._writes = queue.SimpleQueue()
+                self._writer_pid = os.getpid()
+                threading.Thread(target=self._write_loop, args=(self._writes,), name="result-cache-writer", daemon=True).start()
+            return self._writes
+
+    def _write_loop(self, writes):
+        while True:
+            entries = [writes.get()]
+            while True:
+                try:
+                    entries.append(writes.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [(key, json.dumps(value, ensure_ascii=False), expires_at) for key, value, expires_at in entries]
+            try:
+                with self._db_lock:
+                    db = self._connection()
+                    db.execute("BEGIN")
+                    try:
+                        db.executemany("INSERT OR REPLACE INTO results (key, value, expires_at) VALUES (?, ?, ?)", rows)
+                    except BaseException:
+                        db.execute("ROLLBACK")
+                        raise
+                    db.execute("COMMIT")
+            except sqlite3.Error as e:
+                logging.warning(f"Failed to write {len(rows)} result cache entries to SQLite: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "shared_tier": bool(self.sqlite_path),
+            }
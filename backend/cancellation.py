@@ -0,0 +1,122 @@
+import asyncio
+import json
+import math
+import time
+
+import metrics
+
+DEADLINE_HEADER = b"x-request-deadline"
+
+
+class CancelAbandonedRequests:
+    """
+    ASGI middleware that cancels a request's handler once nobody will read the
+    answer: when the client disconnects, or when the time given in the
+    optional `X-Request-Deadline` header (Unix time in seconds) passes.
+
+    Cancellation runs through the handler's awaits, so queued model work no
+    other request waits for is dropped and running beam searches stop at the
+    next decoder step (see SingleFlight and MicroBatcher.abandon). A passed
+    deadline is answered with 504, or ends a response that already started;
+    a disconnected client gets nothing.
+
+    Disconnects are only watched for once the request body has been read,
+    because `receive` is the handler's until then.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        try:
+            deadline = request_deadline(scope)
+        except ValueError:
+            await send_json(send, 400, {"detail": "X-Request-Deadline must be a Unix time in seconds"})
+            return
+        if deadline is not None and deadline <= time.time():
+            metrics.CANCELLED_REQUESTS.labels("deadline").inc()
+            await send_json(send, 504, {"detail": "Request deadline already passed"})
+            return
+
+        body_read = asyncio.Event()
+        disconnected = asyncio.Event()
+        response = {"started": False, "complete": False}
+
+        async def handler_receive():
+            if body_read.is_set():
+                # The watcher owns `receive` now; the only message left is the disconnect
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+            elif not message.get("more_body", False):
+                body_read.set()
+            return message
+
+        async def handler_send(message):
+            if message["type"] == "http.response.start":
+                response["started"] = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                response["complete"] = True
+            await send(message)
+
+        async def watch_disconnect():
+            await body_read.wait()
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        handler = asyncio.ensure_future(self.app(scope, handler_receive, handler_send))
+        watcher = asyncio.ensure_future(watch_disconnect())
+        timeout = None if deadline is None else deadline - time.time()
+        try:
+            done, _ = await asyncio.wait({handler, watcher}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        except BaseException:
+            # The server is cancelling this request itself
+            handler.cancel()
+            raise
+        finally:
+            watcher.cancel()
+        if handler in done or response["complete"]:
+            # Done on its own; a client that hung up after the last byte has missed nothing
+            await handler
+            return
+        handler.cancel()
+        try:
+            await handler
+        except asyncio.CancelledError:
+            pass
+        if disconnected.is_set():
+            metrics.CANCELLED_REQUESTS.labels("disconnect").inc()
+            return
+        metrics.CANCELLED_REQUESTS.labels("deadline").inc()
+        if not response["started"]:
+            await send_json(send, 504, {"detail": "Request deadline passed"})
+        elif not response["complete"]:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def request_deadline(scope):
+    """The X-Request-Deadline as a Unix time, or None; ValueError unless it is a finite number."""
+    for name, value in scope["headers"]:
+        if name == DEADLINE_HEADER:
+            deadline = float(value)
+            # nan would never pass and inf would disable the timeout while looking set
+            if not math.isfinite(deadline):
+                raise ValueError(f"Non-finite deadline {deadline}")
+            return deadline
+    return None
+
+
+async def send_json(send, status_code, content):
+    body = json.dumps(content).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
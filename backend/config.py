@@ -0,0 +1,107 @@
+import os
+
+# Model checkpoints
+KEYWORD_MODEL_PATH = os.getenv("KEYWORD_MODEL_PATH", "./models/best_keyword_model")
+TAG_MODEL_PATH = os.getenv("TAG_MODEL_PATH", "./models/best_tag_model")
+# Language served by the two checkpoints above; requests with no detectable language go here too
+DEFAULT_LANGUAGE = os.getenv("DEFAULT_LANGUAGE", "id")
+# Optional JSON list of extra checkpoints, e.g.
+# [{"task": "tag", "language": "en", "version": "v1", "path": "./models/tag_en"}]
+MODEL_REGISTRY_PATH = os.getenv("MODEL_REGISTRY_PATH", "")
+# Re-read MODEL_REGISTRY_PATH this often and swap in newly added entries in every worker (0 disables)
+MODEL_REGISTRY_POLL_SECONDS = float(os.getenv("MODEL_REGISTRY_POLL_SECONDS", "0"))
+# Token for the /admin endpoints (sent as X-Admin-Token); they are disabled while this is empty
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Evict least recently used models when loading another would push RSS past this (0 disables)
+MODEL_MEMORY_BUDGET_MB = int(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))
+# Execution backend chosen at startup: "torch" (eager PyTorch) or "onnx" (ONNX Runtime on CPU)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+# Load weights once in the master process before gunicorn forks workers (see gunicorn.conf.py)
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "0") == "1"
+# Dynamic INT8 quantization of Linear layers, selectable per model (torch backend, CPU only)
+KEYWORD_QUANTIZE = os.getenv("KEYWORD_QUANTIZE", "0") == "1"
+TAG_QUANTIZE = os.getenv("TAG_QUANTIZE", "0") == "1"
+
+# Tokenization and generation
+MAX_LENGTH = 256
+MAX_INPUT_LENGTH = 256
+MAX_TARGET_LENGTH = 100
+PREFIX = "generate tags: "
+TAG_GENERATION_PARAMS = {
+    "max_length": MAX_TARGET_LENGTH + 10,
+    "num_beams": 5,
+    "early_stopping": True,
+    "no_repeat_ngram_size": 2,
+}
+# Named decoding profiles for /generate_tags, ordered from slowest to fastest.
+# Requests may pick one; the server steps down this list when the queue or the
+# caller's latency budget requires it.
+TAG_DECODING_PROFILES = {
+    "quality": TAG_GENERATION_PARAMS,
+    "balanced": {
+        "max_length": MAX_TARGET_LENGTH + 10,
+        "num_beams": 3,
+        "early_stopping": True,
+        "no_repeat_ngram_size": 2,
+    },
+    "fast": {
+        "max_length": 48,
+        "num_beams": 1,
+        "no_repeat_ngram_size": 2,
+    },
+}
+TAG_DEFAULT_PROFILE = os.getenv("TAG_DEFAULT_PROFILE", "quality")
+# Step down one profile for every this many tag requests already waiting (0 disables)
+TAG_DOWNGRADE_QUEUE_DEPTH = int(os.getenv("TAG_DOWNGRADE_QUEUE_DEPTH", "16"))
+# Upper bound for the per-request number of tags
+TAG_MAX_TAGS = int(os.getenv("TAG_MAX_TAGS", "20"))
+# Streaming tag generation supports greedy or small-beam decoding only; only greedy decoding
+# streams tags as they complete, with beams they are all sent when generation ends
+TAG_STREAM_MAX_BEAMS = int(os.getenv("TAG_STREAM_MAX_BEAMS", "3"))
+# Precompiled tag trie for constrained decoding (built by tag_vocab.py); empty disables it
+TAG_TRIE_PATH = os.getenv("TAG_TRIE_PATH", "./models/tag_trie.npz")
+ID2LABEL = {0: 'O', 1: 'B-KEY', 2: 'I-KEY'}
+# Tokens shared between consecutive windows in sliding-window keyword extraction
+KEYWORD_WINDOW_STRIDE = int(os.getenv("KEYWORD_WINDOW_STRIDE", "64"))
+
+# Warmup batch run through each model before the worker reports ready (0 disables)
+WARMUP_BATCH_SIZE = int(os.getenv("WARMUP_BATCH_SIZE", "2"))
+WARMUP_TEXT = os.getenv(
+    "WARMUP_TEXT",
+    "judul: Pemerintah Luncurkan Program Energi Baru konten: Pemerintah meluncurkan program energi "
+    "terbarukan untuk mempercepat transisi energi nasional dan mengurangi emisi karbon.",
+)
+
+# Micro-batching: requests arriving within the wait window are run as one batch
+KEYWORD_BATCH_SIZE = int(os.getenv("KEYWORD_BATCH_SIZE", "32"))
+KEYWORD_BATCH_WAIT_MS = float(os.getenv("KEYWORD_BATCH_WAIT_MS", "10"))
+TAG_BATCH_SIZE = int(os.getenv("TAG_BATCH_SIZE", "8"))
+TAG_BATCH_WAIT_MS = float(os.getenv("TAG_BATCH_WAIT_MS", "10"))
+
+# Result cache: in-memory LRU tier plus an optional SQLite tier shared by all workers
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "3600"))
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", "")
+
+# Admission control per model: bounded queue and a latency budget for the expected wait
+KEYWORD_MAX_QUEUE = int(os.getenv("KEYWORD_MAX_QUEUE", "128"))
+KEYWORD_LATENCY_BUDGET_MS = float(os.getenv("KEYWORD_LATENCY_BUDGET_MS", "10000"))
+TAG_MAX_QUEUE = int(os.getenv("TAG_MAX_QUEUE", "32"))
+# Below the 30 s timeout of the Streamlit frontend
+TAG_LATENCY_BUDGET_MS = float(os.getenv("TAG_LATENCY_BUDGET_MS", "20000"))
+# Statistical fallback indexes (built by fallback.py), served when a model queue is overloaded; empty disables
+FALLBACK_INDEX_DIR = os.getenv("FALLBACK_INDEX_DIR", "./models/fallback")
+# NDJSON bulk endpoints: records per submitted chunk, chunks running at once, and the longest
+# pause before retrying a chunk the queue rejected
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "32"))
+BULK_MAX_IN_FLIGHT = int(os.getenv("BULK_MAX_IN_FLIGHT", "2"))
+BULK_MAX_RETRY_WAIT_SECONDS = float(os.getenv("BULK_MAX_RETRY_WAIT_SECONDS", "5"))
+# Asynchronous /jobs: where job inputs, checkpoints and gzip results are kept (empty disables the endpoints)
+JOBS_DIR = os.getenv("JOBS_DIR", "./jobs")
+# Processed CSVs that jobs may name as their input instead of uploading it
+JOBS_DATA_DIR = os.getenv("JOBS_DATA_DIR", "../data/processed")
+# Records per checkpoint (and per compressed result part), and how often idle workers look for queued jobs
+JOBS_CHECKPOINT_RECORDS = int(os.getenv("JOBS_CHECKPOINT_RECORDS", "1000"))
+JOBS_POLL_SECONDS = float(os.getenv("JOBS_POLL_SECONDS", "5"))
+# Intra-op threads for torch inference (0 keeps the torch default)
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", "0"))
@@ -0,0 +1,131 @@
+"""
+Compare dynamic INT8 quantized models against their fp32 originals on a
+held-out slice of the processed CSVs (the output of `save_csv_processed`).
+
+    python evaluate_quantization.py --task both --rows 200
+
+Keywords are scored against the `kata_kunci` column of the ETD datasets and
+tags against the `tag` column of the news datasets. The report lists micro
+precision/recall/F1 for both variants, how often they produce identical
+output, and total inference time.
+"""
+import argparse
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from config import KEYWORD_MODEL_PATH, TAG_MODEL_PATH
+from inference import extract_keywords, generate_tag_lists
+from models import load_keyword_model, load_tag_model, quantize_int8
+
+KEYWORD_SOURCES = ["etd_usk", "etd_ugm"]
+TAG_SOURCES = ["kompas", "tempo", "mojok", "medium"]
+
+
+def split_labels(value):
+    return {label.strip().lower() for label in str(value).split(",") if label.strip()}
+
+
+def load_slice(data_dir, sources, columns, rows):
+    frames = []
+    for source in sources:
+        csv_path = Path(data_dir) / f"{source}.csv"
+        if not csv_path.exists():
+            print(f"[WARN] {csv_path} tidak ditemukan, dilewati.")
+            continue
+        df = pd.read_csv(csv_path).dropna(subset=columns)
+        frames.append(df.tail(rows))
+    if not frames:
+        return None
+    return pd.concat(frames, ignore_index=True)
+
+
+def micro_prf(predictions, references):
+    true_positive = predicted = expected = 0
+    for prediction, reference in zip(predictions, references):
+        prediction = {label.strip().lower() for label in prediction if label.strip()}
+        true_positive += len(prediction & reference)
+        predicted += len(prediction)
+        expected += len(reference)
+    precision = true_positive / predicted if predicted else 0.0
+    recall = true_positive / expected if expected else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return precision, recall, f1
+
+
+def run_in_batches(fn, texts, batch_size):
+    outputs = []
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        outputs.extend(fn(texts[i:i + batch_size]))
+    return outputs, time.perf_counter() - start
+
+
+def report(name, texts, references, fp32_fn, int8_fn, batch_size):
+    fp32_outputs, fp32_seconds = run_in_batches(fp32_fn, texts, batch_size)
+    int8_outputs, int8_seconds = run_in_batches(int8_fn, texts, batch_size)
+    fp32_p, fp32_r, fp32_f1 = micro_prf(fp32_outputs, references)
+    int8_p, int8_r, int8_f1 = micro_prf(int8_outputs, references)
+    agreement = sum(a == b for a, b in zip(fp32_outputs, int8_outputs)) / len(texts)
+
+    print(f"\n=== {name} ({len(texts)} dokumen) ===")
+    print(f"{'':6} {'P':>7} {'R':>7} {'F1':>7} {'waktu (s)':>10}")
+    print(f"{'fp32':6} {fp32_p:7.4f} {fp32_r:7.4f} {fp32_f1:7.4f} {fp32_seconds:10.2f}")
+    print(f"{'int8':6} {int8_p:7.4f} {int8_r:7.4f} {int8_f1:7.4f} {int8_seconds:10.2f}")
+    print(f"Selisih F1 (int8 - fp32): {int8_f1 - fp32_f1:+.4f}")
+    print(f"Output identik: {agreement:.2%}")
+
+
+def evaluate_keywords(args):
+    df = load_slice(args.data_dir, KEYWORD_SOURCES, ["abstrak", "kata_kunci"], args.rows)
+    if df is None:
+        print("[ERROR] Tidak ada data kata kunci untuk evaluasi.")
+        return
+    tokenizer, model = load_keyword_model(KEYWORD_MODEL_PATH)
+    int8_model = quantize_int8(model)
+    report(
+        "Kata Kunci",
+        df["abstrak"].astype(str).tolist(),
+        [split_labels(value) for value in df["kata_kunci"]],
+        lambda texts: [result["keywords"] for result in extract_keywords(tokenizer, model, texts)],
+        lambda texts: [result["keywords"] for result in extract_keywords(tokenizer, int8_model, texts)],
+        args.batch_size,
+    )
+
+
+def evaluate_tags(args):
+    df = load_slice(args.data_dir, TAG_SOURCES, ["judul", "konten", "tag"], args.rows)
+    if df is None:
+        print("[ERROR] Tidak ada data tag untuk evaluasi.")
+        return
+    tokenizer, model = load_tag_model(TAG_MODEL_PATH)
+    int8_model = quantize_int8(model)
+    # Same input format the frontend sends
+    texts = [f"judul: {judul} konten: {konten}" for judul, konten in zip(df["judul"], df["konten"])]
+    report(
+        "Tag",
+        texts,
+        [split_labels(value) for value in df["tag"]],
+        lambda batch: generate_tag_lists(tokenizer, model, batch),
+        lambda batch: generate_tag_lists(tokenizer, int8_model, batch),
+        args.batch_size,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluasi akurasi model INT8 terhadap fp32.")
+    parser.add_argument("--task", choices=["keyword", "tag", "both"], default="both")
+    parser.add_argument("--data-dir", default="../data/processed")
+    parser.add_argument("--rows", type=int, default=200, help="Jumlah baris terakhir per sumber yang dievaluasi")
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args()
+
+    if args.task in ("keyword", "both"):
+        evaluate_keywords(args)
+    if args.task in ("tag", "both"):
+        evaluate_tags(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Statistical fallbacks served instead of the models when their queues are overloaded.
+
+Keywords are scored by TF-IDF over the input's word n-grams, with an IDF
+table built from the ETD abstracts. Tags are tags from the news datasets
+that appear verbatim in the text, expanded with the tags they most often
+co-occur with. Both indexes are built offline into flat .npy arrays
+
+    python fallback.py --data-dir ../data/processed --output-dir ./models/fallback
+
+and memory-mapped by the API, so loading is instant and pre-forked workers
+share the pages. Terms are stored as 64-bit hashes, looked up with binary search.
+"""
+import argparse
+import hashlib
+import logging
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import numpy as np
+
+KEYWORD_SOURCES = ["etd_usk", "etd_ugm"]
+TAG_SOURCES = ["kompas", "tempo", "mojok", "medium"]
+
+MAX_NGRAM = 3
+WORD = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset(
+    """
+    ada adalah agar akan antara atau bagi bahwa belum bisa dalam dan dapat dari dengan di dia dimana hal
+    hingga ia ini itu juga kami karena ke kepada kita lebih maka masih mereka namun oleh pada para saat
+    sangat sebagai secara seperti serta setelah sudah tidak telah terhadap tersebut untuk yaitu yang
+    a an and are as at be by for from in is it of on or that the this to was were which with
+    """.split()
+)
+
+KEYWORD_FILES = ("keyword_hashes", "keyword_idf")
+TAG_FILES = ("tag_hashes", "tag_names", "tag_counts", "cooc_indptr", "cooc_indices", "cooc_weights")
+
+
+def term_hash(term):
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def words(text):
+    return [(m.group().lower(), m.start(), m.end()) for m in WORD.finditer(text)]
+
+
+def ngrams(tokens, max_n=MAX_NGRAM, skip_stopwords=True):
+    """
+    Yield (term, first_index, last_index) for every n-gram of up to `max_n`
+    words; with `skip_stopwords`, n-grams that start or end with a stopword
+    or a number are left out.
+    """
+    for n in range(1, max_n + 1):
+        for i in range(len(tokens) - n + 1):
+            first, last = tokens[i][0], tokens[i + n - 1][0]
+            if skip_stopwords and (first in STOPWORDS or last in STOPWORDS or first.isdigit() or last.isdigit()):
+                continue
+            yield " ".join(token[0] for token in tokens[i:i + n]), i, i + n - 1
+
+
+def lookup(hashes, keys):
+    """Index of each key in the sorted `hashes` array, or -1 where it is missing."""
+    keys = np.asarray(keys, dtype=np.uint64)
+    positions = np.searchsorted(hashes, keys)
+    positions[positions == len(hashes)] = 0
+    found = len(hashes) > 0 and hashes[positions] == keys
+    return np.where(found, positions, -1)
+
+
+class KeywordFallback:
+    def __init__(self, hashes, idf):
+        self.hashes = hashes
+        self.idf = idf
+        # Terms never seen in the corpus are rare by definition
+        self.unseen_idf = float(idf.max()) if len(idf) else 1.0
+
+    def extract(self, text, limit=10):
+        """Top TF-IDF n-grams, in the same shape as the keyword model's results."""
+        tokens = words(text)
+        occurrences = defaultdict(list)
+        for term, first, last in ngrams(tokens):
+            occurrences[term].append((tokens[first][1], tokens[last][2]))
+        if not occurrences:
+            return {"keywords": [], "spans": []}
+
+        terms = list(occurrences)
+        positions = lookup(self.hashes, [term_hash(term) for term in terms])
+        scored = []
+        for term, position in zip(terms, positions):
+            n = term.count(" ") + 1
+            if position < 0 and n > 1:
+                # Only phrases the corpus has actually seen qualify
+                continue
+            idf = float(self.idf[position]) if position >= 0 else self.unseen_idf
+            scored.append((len(occurrences[term]) * idf * n, term))
+        scored.sort(reverse=True)
+
+        chosen, taken = [], []
+        for _, term in scored:
+            # Skip n-grams overlapping an already chosen keyword anywhere in the text
+            if any(start < end_ and start_ < end for start, end in occurrences[term] for start_, end_ in taken):
+                continue
+            chosen.append(term)
+            taken.extend(occurrences[term])
+            if len(chosen) == limit:
+                break
+        keywords = [text[slice(*occurrences[term][0])] for term in chosen]
+        spans = [
+            {"text": text[start:end], "start": start, "end": end}
+            for start, end in sorted(span for term in chosen for span in occurrences[term])
+        ]
+        return {"keywords": keywords, "spans": spans}
+
+
+class TagFallback:
+    def __init__(self, hashes, names, counts, indptr, indices, weights):
+        self.hashes = hashes
+        self.names = names
+        self.counts = counts
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+
+    def extract(self, text, limit=10):
+        """Known tags mentioned in the text, then the tags that most often accompany them."""
+        tokens = words(text)
+        terms = Counter(term for term, _, _ in ngrams(tokens, skip_stopwords=False))
+        if not terms:
+            return []
+        positions = lookup(self.hashes, [term_hash(term) for term in terms])
+        scores = defaultdict(float)
+        for term, position in zip(terms, positions):
+            if position < 0:
+                continue
+            # Direct mentions always outrank co-occurrence evidence
+            scores[int(position)] += 1.0 + terms[term]
+            start, end = self.indptr[position], self.indptr[position + 1]
+            # P(neighbour | mentioned tag)
+            for neighbour, weight in zip(self.indices[start:end], self.weights[start:end]):
+                scores[int(neighbour)] += float(weight) / float(self.counts[position])
+        ranked = sorted(scores, key=lambda tag: (-scores[tag], -int(self.counts[tag])))
+        return [str(self.names[tag]) for tag in ranked[:limit]]
+
+
+def _load_arrays(index_dir, names):
+    paths = [os.path.join(index_dir, f"{name}.npy") for name in names]
+    if not all(os.path.exists(path) for path in paths):
+        return None
+    return [np.load(path, mmap_mode="r") for path in paths]
+
+
+def load_fallbacks(index_dir):
+    """Memory-map whichever fallback indexes exist in `index_dir`; returns (keyword, tag), either may be None."""
+    if not index_dir:
+        return None, None
+    keyword_arrays = _load_arrays(index_dir, KEYWORD_FILES)
+    tag_arrays = _load_arrays(index_dir, TAG_FILES)
+    keyword = KeywordFallback(*keyword_arrays) if keyword_arrays else None
+    tag = TagFallback(*tag_arrays) if tag_arrays else None
+    logging.info(
+        f"Fallback indexes in {index_dir!r}: keyword={'on' if keyword else 'off'}, tag={'on' if tag else 'off'}"
+    )
+    return keyword, tag
+
+
+def read_column(data_dir, sources, column):
+    import pandas as pd
+
+    for source in sources:
+        csv_path = Path(data_dir) / f"{source}.csv"
+        if not csv_path.exists():
+            print(f"[WARN] {csv_path} tidak ditemukan, dilewati.")
+            continue
+        df = pd.read_csv(csv_path, usecols=[column]).dropna()
+        print(f"[INFO] {source}: {len(df)} baris dibaca")
+        yield from df[column].astype(str)
+
+
+def build_keyword_index(data_dir, output_dir, min_df):
+    document_frequency = Counter()
+    documents = 0
+    for abstract in read_column(data_dir, KEYWORD_SOURCES, "abstrak"):
+        document_frequency.update({term for term, _, _ in ngrams(words(abstract))})
+        documents += 1
+    terms = [term for term, df in document_frequency.items() if df >= min_df]
+    hashes = np.array([term_hash(term) for term in terms], dtype=np.uint64)
+    idf = np.array(
+        [math.log((documents + 1) / (document_frequency[term] + 1)) + 1 for term in terms], dtype=np.float32
+    )
+    order = np.argsort(hashes)
+    np.save(output_dir / "keyword_hashes.npy", hashes[order])
+    np.save(output_dir / "keyword_idf.npy", idf[order])
+    print(f"[INFO] IDF: {len(terms)} term dari {documents} abstrak")
+
+
+def build_tag_index(data_dir, output_dir, min_count, max_neighbours):
+    spellings = defaultdict(Counter)
+    articles = []
+    for value in read_column(data_dir, TAG_SOURCES, "tag"):
+        article = set()
+        for tag in value.split(","):
+            tag = " ".join(tag.split())
+            key = " ".join(term for term, _, _ in words(tag))
+            if key:
+                spellings[key][tag] += 1
+                article.add(key)
+        articles.append(article)
+
+    keys = [key for key, counts in spellings.items() if sum(counts.values()) >= min_count]
+    hashes = np.array([term_hash(key) for key in keys], dtype=np.uint64)
+    order = np.argsort(hashes)
+    keys = [keys[i] for i in order]
+    index = {key: i for i, key in enumerate(keys)}
+
+    cooccurrence = defaultdict(Counter)
+    for article in articles:
+        known = [index[key] for key in article if key in index]
+        for tag in known:
+            cooccurrence[tag].update(other for other in known if other != tag)
+
+    indptr, indices, weights = [0], [], []
+    for tag in range(len(keys)):
+        for neighbour, count in cooccurrence[tag].most_common(max_neighbours):
+            indices.append(neighbour)
+            weights.append(count)
+        indptr.append(len(indices))
+
+    names = [spellings[key].most_common(1)[0][0] for key in keys]
+    np.save(output_dir / "tag_hashes.npy", hashes[order])
+    np.save(output_dir / "tag_names.npy", np.array(names, dtype=str))
+    np.save(output_dir / "tag_counts.npy", np.array([sum(spellings[key].values()) for key in keys], dtype=np.int32))
+    np.save(output_dir / "cooc_indptr.npy", np.array(indptr, dtype=np.int64))
+    np.save(output_dir / "cooc_indices.npy", np.array(indices, dtype=np.int32))
+    np.save(output_dir / "cooc_weights.npy", np.array(weights, dtype=np.float32))
+    print(f"[INFO] Tag: {len(keys)} tag, {len(indices)} pasangan ko-okurensi dari {len(articles)} artikel")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bangun indeks fallback (IDF kata kunci dan ko-okurensi tag).")
+    parser.add_argument("--data-dir", default="../data/processed")
+    parser.add_argument("--output-dir", default="./models/fallback")
+    parser.add_argument("--min-df", type=int, default=2, help="Frekuensi dokumen minimum sebuah n-gram")
+    parser.add_argument("--min-count", type=int, default=2, help="Frekuensi minimum sebuah tag")
+    parser.add_argument("--max-neighbours", type=int, default=50, help="Tetangga ko-okurensi per tag")
+    args = parser.parse_args()
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    build_keyword_index(args.data_dir, output_dir, args.min_df)
+    build_tag_index(args.data_dir, output_dir, args.min_count, args.max_neighbours)
+
+
+if __name__ == "__main__":
+    main()
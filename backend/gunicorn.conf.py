@@ -0,0 +1,13 @@
+# Pre-fork serving: models are loaded once in the master and shared copy-on-write.
+#
+#   cd backend && PRELOAD_MODELS=1 WEB_CONCURRENCY=4 gunicorn -c gunicorn.conf.py main:app
+#
+# Without PRELOAD_MODELS=1 every worker loads its own copy, as with plain uvicorn.
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.getenv("PRELOAD_MODELS", "0") == "1"
+# Model loading and warmup happen before a worker reports ready; give it time
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
@@ -0,0 +1,297 @@
+import time
+from functools import lru_cache
+
+import numpy as np
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList
+
+from config import (
+    MAX_LENGTH,
+    MAX_INPUT_LENGTH,
+    PREFIX,
+    TAG_GENERATION_PARAMS,
+    ID2LABEL,
+    KEYWORD_WINDOW_STRIDE,
+)
+
+CPU = torch.device("cpu")
+LABEL2ID = {label: label_id for label_id, label in ID2LABEL.items()}
+
+
+def record_inputs(timings, encoding, sample_mapping=None):
+    """
+    Note the input token count of every text and how many texts lost tokens to
+    truncation. With `sample_mapping` (sliding windows) a text's windows are
+    counted as one input and nothing is truncated, since the windows cover it.
+    """
+    lengths = encoding["attention_mask"].sum(dim=1).cpu().numpy()
+    if sample_mapping is not None:
+        timings["input_tokens"] = np.bincount(sample_mapping, weights=lengths).astype(int).tolist()
+        timings["truncated"] = 0
+        return
+    timings["input_tokens"] = lengths.tolist()
+    # The fast tokenizer keeps the tokens cut off by truncation on each row's encoding
+    timings["truncated"] = sum(bool(row.overflowing) for row in encoding.encodings)
+
+
+def length_sorted(texts):
+    """Return indices ordered by text length so neighbouring items pad tightly together."""
+    return sorted(range(len(texts)), key=lambda i: len(texts[i]))
+
+
+def bio_spans(predictions, valid):
+    """
+    Find B-KEY/I-KEY runs over a whole (batch, seq) array of label ids at once.
+
+    A span starts at a B-KEY and continues through consecutive I-KEY tokens;
+    an I-KEY with no open span is ignored, as are positions where `valid` is
+    False. Returns (rows, first_token, last_token) index arrays in row-major order.
+    """
+    labels = np.where(valid, predictions, LABEL2ID["O"])
+    is_begin = labels == LABEL2ID["B-KEY"]
+    is_inside = labels == LABEL2ID["I-KEY"]
+    positions = np.arange(labels.shape[1])
+    last_begin = np.maximum.accumulate(np.where(is_begin, positions, -1), axis=1)
+    last_outside = np.maximum.accumulate(np.where(is_begin | is_inside, -1, positions), axis=1)
+    in_span = is_begin | (is_inside & (last_begin > last_outside))
+    continues = np.zeros_like(in_span)
+    continues[:, :-1] = in_span[:, 1:] & is_inside[:, 1:]
+    rows, last_token = np.nonzero(in_span & ~continues)
+    return rows, last_begin[rows, last_token], last_token
+
+
+def merge_spans(spans):
+    """Union overlapping character spans, e.g. the same keyword seen by two overlapping windows."""
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start < merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def keyword_result(text, spans):
+    keywords = {}
+    keyword_spans = []
+    for start, end in spans:
+        keyword = text[start:end]
+        key = keyword.lower()
+        if key not in keywords and len(keywords) < 10:
+            keywords[key] = keyword
+        if key in keywords:
+            keyword_spans.append({"text": keyword, "start": start, "end": end})
+    return {"keywords": list(keywords.values()), "spans": keyword_spans}
+
+
+def extract_keywords(tokenizer, model, texts, sliding_window=False, device=CPU, timings=None):
+    """
+    Run one padded-to-longest forward pass over a batch of texts and slice
+    keywords straight out of the original text using the fast tokenizer's
+    offset mapping.
+
+    With `sliding_window`, each text is covered by overlapping MAX_LENGTH
+    windows (KEYWORD_WINDOW_STRIDE tokens of overlap) and every window of
+    every text goes through the model in the same pass; spans found in
+    overlapping windows are merged by character offsets.
+
+    If `timings` is given it is filled with per-stage seconds and input sizes.
+    """
+    timings = {} if timings is None else timings
+    start = time.perf_counter()
+    window_args = {"stride": KEYWORD_WINDOW_STRIDE, "return_overflowing_tokens": True} if sliding_window else {}
+    encoding = tokenizer(
+        texts,
+        return_tensors="pt",
+        max_length=MAX_LENGTH,
+        truncation=True,
+        padding="longest",
+        return_offsets_mapping=True,
+        return_special_tokens_mask=True,
+        **window_args,
+    )
+    offsets = encoding.pop("offset_mapping").numpy()
+    special_tokens_mask = encoding.pop("special_tokens_mask").numpy().astype(bool)
+    if sliding_window:
+        sample_mapping = encoding.pop("overflow_to_sample_mapping").numpy()
+    else:
+        sample_mapping = np.arange(len(texts))
+    inputs = {k: v.to(device) for k, v in encoding.items()}
+    record_inputs(timings, encoding, sample_mapping if sliding_window else None)
+    tokenized = time.perf_counter()
+
+    with torch.no_grad():
+        logits = model(**inputs).logits
+
+    predictions = torch.argmax(logits, dim=2).cpu().numpy()
+    inferred = time.perf_counter()
+    valid = encoding["attention_mask"].numpy().astype(bool) & ~special_tokens_mask
+    rows, first_token, last_token = bio_spans(predictions, valid)
+    documents = sample_mapping[rows].tolist()
+    char_starts = offsets[rows, first_token, 0].tolist()
+    char_ends = offsets[rows, last_token, 1].tolist()
+
+    spans = [[] for _ in texts]
+    for document, start, end in zip(documents, char_starts, char_ends):
+        spans[document].append((start, end))
+    results = [keyword_result(text, merge_spans(text_spans)) for text, text_spans in zip(texts, spans)]
+
+    timings["tokenize"] = tokenized - start
+    timings["inference"] = inferred - tokenized
+    timings["postprocess"] = time.perf_counter() - inferred
+    return results
+
+
+def split_tags(decoded, limit=10):
+    return [tag.strip() for tag in decoded.split(',')][:limit]
+
+
+@lru_cache(maxsize=None)
+def separator_token_ids(tokenizer):
+    """Ids of every vocabulary token containing a comma, i.e. tokens that close a tag."""
+    return torch.tensor([token_id for token, token_id in tokenizer.get_vocab().items() if "," in token])
+
+
+class TagCountStopper(StoppingCriteria):
+    """
+    Stop generation once every live sequence holds its requested number of
+    complete (comma-terminated) tags, or has already emitted EOS. Tags past
+    that count would be dropped anyway, so the remaining decoder steps are waste.
+    """
+
+    def __init__(self, tokenizer, num_tags):
+        self.separator_ids = separator_token_ids(tokenizer)
+        self.eos_token_id = tokenizer.eos_token_id
+        self.num_tags = torch.tensor(num_tags)
+
+    def __call__(self, input_ids, scores, **kwargs):
+        # Rows are grouped per text: (batch * num_beams, seq)
+        thresholds = self.num_tags.to(input_ids.device).repeat_interleave(input_ids.shape[0] // len(self.num_tags))
+        counts = torch.isin(input_ids, self.separator_ids.to(input_ids.device)).sum(dim=1)
+        done = counts >= thresholds
+        if self.eos_token_id is not None:
+            done |= (input_ids[:, 1:] == self.eos_token_id).any(dim=1)
+        return bool(done.all())
+
+
+class CancelStopper(StoppingCriteria):
+    """Stop generation between decoder steps once `cancelled()` says no caller is waiting for the batch any more."""
+
+    def __init__(self, cancelled):
+        self.cancelled = cancelled
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return bool(self.cancelled())
+
+
+def generate_tag_lists(
+    tokenizer,
+    model,
+    texts,
+    device=CPU,
+    generation_params=TAG_GENERATION_PARAMS,
+    stopping_criteria=None,
+    timings=None,
+    num_tags=None,
+    tag_trie=None,
+):
+    """
+    Run one padded-to-longest beam search over a batch of texts. `num_tags`
+    (one count per text) caps how many tags are returned for each text and
+    stops decoding as soon as every text has that many. With a `tag_trie`
+    every beam is restricted to tags from that vocabulary.
+    """
+    timings = {} if timings is None else timings
+    start = time.perf_counter()
+    stopping_criteria = list(stopping_criteria or [])
+    if num_tags is not None:
+        stopping_criteria.append(TagCountStopper(tokenizer, num_tags))
+    limits = num_tags or [10] * len(texts)
+    constraint = {"prefix_allowed_tokens_fn": tag_trie.prefix_allowed_tokens_fn()} if tag_trie is not None else {}
+    combined_texts = [PREFIX + text for text in texts]
+    inputs = tokenizer(
+        combined_texts,
+        return_tensors="pt",
+        max_length=MAX_INPUT_LENGTH,
+        truncation=True,
+        padding="longest"
+    ).to(device)
+    record_inputs(timings, inputs)
+    tokenized = time.perf_counter()
+
+    with torch.no_grad():
+        output = model.generate(
+            input_ids=inputs["input_ids"],
+            attention_mask=inputs["attention_mask"],
+            stopping_criteria=StoppingCriteriaList(stopping_criteria),
+            **constraint,
+            **generation_params
+        )
+    generated = time.perf_counter()
+
+    decoded_texts = tokenizer.batch_decode(output, skip_special_tokens=True)
+    results = [split_tags(decoded, limit) for decoded, limit in zip(decoded_texts, limits)]
+
+    timings["tokenize"] = tokenized - start
+    timings["inference"] = generated - tokenized
+    timings["postprocess"] = time.perf_counter() - generated
+    return results
+
+
+class TagStreamer(StoppingCriteria):
+    """
+    Report tags while greedy `generate` is still running. Called after every
+    decoder step, it decodes each text's sequence so far and passes every
+    newly completed (comma-terminated) tag to that text's callback, which is
+    exactly the final output. Only used for greedy decoding: with beams, a
+    hypothesis that already finished sits in the beam scorer and can still
+    win, so no prefix of the live beams is safe to report.
+    Never asks generation to stop.
+    """
+
+    def __init__(self, tokenizer, callbacks, limits):
+        self.tokenizer = tokenizer
+        self.callbacks = callbacks
+        self.limits = limits
+        self.emitted = [0] * len(callbacks)
+
+    def __call__(self, input_ids, scores, **kwargs):
+        beams = input_ids.view(len(self.callbacks), -1, input_ids.shape[-1])
+        for i, callback in enumerate(self.callbacks):
+            rows = beams[i]
+            agree = (rows == rows[0]).all(dim=0)
+            disagree = (~agree).nonzero()
+            prefix_len = int(disagree[0]) if len(disagree) else rows.shape[-1]
+            parts = self.tokenizer.decode(rows[0, :prefix_len], skip_special_tokens=True).split(',')
+            # The last part is still being generated
+            complete = [tag.strip() for tag in parts[:-1]][:self.limits[i]]
+            for tag in complete[self.emitted[i]:]:
+                if tag:
+                    callback(tag)
+            self.emitted[i] = max(self.emitted[i], len(complete))
+        return False
+
+
+def stream_tag_lists(
+    tokenizer,
+    model,
+    texts,
+    callbacks,
+    num_tags,
+    device=CPU,
+    generation_params=TAG_GENERATION_PARAMS,
+    timings=None,
+    tag_trie=None,
+    stopping_criteria=None,
+):
+    """
+    Generate tags, passing each one to its text's callback as soon as it is
+    final. With beam search nothing is final before generation ends, so the
+    callbacks are not called and callers report the returned tags instead.
+    """
+    stopping_criteria = list(stopping_criteria or [])
+    if generation_params.get("num_beams", 1) == 1:
+        stopping_criteria.append(TagStreamer(tokenizer, callbacks, num_tags))
+    return generate_tag_lists(
+        tokenizer, model, texts, device, generation_params, stopping_criteria, timings, num_tags, tag_trie,
+    )
@@ -0,0 +1,201 @@
+"""
+Asynchronous bulk jobs persisted on disk, served by the /jobs endpoints.
+
+Every job is a directory under JOBS_DIR:
+
+    job.json               spec, status and checkpoint, replaced atomically
+    input.ndjson           the {"id", "text"} records to process
+    part-00000.jsonl.gz    results, one gzip part per checkpoint
+    lock                   flock'ed by the worker running the job
+    cancel                 created to ask that worker to stop and delete the job
+
+A part is renamed into place before the checkpoint that covers it is saved,
+so a job resumes from its last checkpoint after a crash or restart and at
+worst recomputes one part. Concatenated gzip parts are themselves a valid
+gzip stream, so results are downloaded without recompressing them. The lock
+is released by the kernel when its process dies, which is how a restarted
+worker (or any other worker sharing JOBS_DIR) knows it may take the job over.
+"""
+import csv
+import fcntl
+import gzip
+import json
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+
+ACTIVE = ("queued", "running")
+
+
+def row_text(task, row):
+    if task == "keyword":
+        return str(row.get("abstrak") or row.get("konten") or "")
+    # Same input format the frontend sends to /generate_tags
+    return f"judul: {row.get('judul', '')} konten: {row.get('konten', '')}"
+
+
+def csv_records(task, path):
+    """`{"id": row, "text"}` for every row of a processed CSV with non-empty text; ids are 0-based row numbers."""
+    # Article bodies can exceed the csv module's default field limit
+    csv.field_size_limit(2**31 - 1)
+    with open(path, newline="", encoding="utf-8") as f:
+        for row_number, row in enumerate(csv.DictReader(f)):
+            text = row_text(task, row)
+            if text.strip():
+                yield {"id": row_number, "text": text}
+
+
+class JobStore:
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self._locks = {}
+
+    def path(self, job_id):
+        # Job ids are generated hex strings; anything else cannot name a job directory
+        if not job_id.isalnum():
+            raise KeyError(job_id)
+        return self.directory / job_id
+
+    def input_path(self, job):
+        return self.path(job["id"]) / "input.ndjson"
+
+    def create(self, task, source, options):
+        """
+        A new job in the "preparing" state, locked by the caller until its
+        input is written and it is queued with `save`.
+        """
+        job_id = uuid.uuid4().hex
+        self.path(job_id).mkdir(parents=True)
+        self.try_lock(job_id)
+        now = time.time()
+        job = {
+            "id": job_id,
+            "task": task,
+            "source": source,
+            "options": options,
+            "status": "preparing",
+            "total": None,
+            "processed": 0,
+            "failed": 0,
+            "parts": 0,
+            "input_offset": 0,
+            "created_at": now,
+            "updated_at": now,
+            "error": None,
+        }
+        self.save(job)
+        return job
+
+    def save(self, job):
+        job["updated_at"] = time.time()
+        path = self.path(job["id"]) / "job.json"
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(tmp, path)
+
+    def get(self, job_id):
+        try:
+            with open(self.path(job_id) / "job.json", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise KeyError(job_id) from None
+
+    def list(self):
+        jobs = []
+        if self.directory.is_dir():
+            for entry in self.directory.iterdir():
+                try:
+                    jobs.append(self.get(entry.name))
+                except (KeyError, ValueError):
+                    # Being created or deleted right now
+                    continue
+        return sorted(jobs, key=lambda job: job["created_at"])
+
+    def write_input(self, job, records):
+        """Write `records` as the job's NDJSON input; returns how many there were."""
+        total = 0
+        with open(self.input_path(job), "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                total += 1
+        return total
+
+    def read_input(self, job, count):
+        """Up to `count` non-empty input lines after the job's checkpoint, and the offset just past them."""
+        lines = []
+        with open(self.input_path(job), "rb") as f:
+            f.seek(job["input_offset"])
+            while len(lines) < count:
+                line = f.readline()
+                if not line:
+                    break
+                if line.strip():
+                    lines.append(line)
+            return lines, f.tell()
+
+    def write_part(self, job, lines):
+        """Compress one checkpoint's result lines into the next part; the checkpoint itself is saved separately."""
+        path = self.path(job["id"]) / f"part-{job['parts']:05d}.jsonl.gz"
+        tmp = path.with_suffix(".tmp")
+        with gzip.open(tmp, "wb") as f:
+            f.writelines(lines)
+        os.replace(tmp, path)
+
+    def part_paths(self, job):
+        return [self.path(job["id"]) / f"part-{i:05d}.jsonl.gz" for i in range(job["parts"])]
+
+    def try_lock(self, job_id):
+        """Take the job's lock without blocking; False if another worker (or this one) holds it."""
+        if job_id in self._locks:
+            return False
+        try:
+            f = open(self.path(job_id) / "lock", "a")
+        except FileNotFoundError:
+            return False
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._locks[job_id] = f
+        return True
+
+    def unlock(self, job_id):
+        f = self._locks.pop(job_id, None)
+        if f is not None:
+            f.close()
+
+    def claim(self):
+        """Lock the oldest queued or interrupted job no worker is running, or return None."""
+        for job in self.list():
+            if job["status"] in ACTIVE and self.try_lock(job["id"]):
+                # Re-read under the lock; it may have finished between listing and locking
+                job = self.get(job["id"])
+                if job["status"] in ACTIVE:
+                    return job
+                self.unlock(job["id"])
+        return None
+
+    def recover(self):
+        """Fail jobs whose input upload was cut off by a restart; nobody holds the lock of such a job."""
+        for job in self.list():
+            if job["status"] == "preparing" and self.try_lock(job["id"]):
+                job = self.get(job["id"])
+                if job["status"] == "preparing":
+                    job["status"] = "failed"
+                    job["error"] = "Input upload was interrupted"
+                    self.save(job)
+                self.unlock(job["id"])
+
+    def request_cancel(self, job_id):
+        (self.path(job_id) / "cancel").touch()
+
+    def cancel_requested(self, job_id):
+        return (self.path(job_id) / "cancel").exists()
+
+    def delete(self, job_id):
+        shutil.rmtree(self.path(job_id), ignore_errors=True)
+        self.unlock(job_id)
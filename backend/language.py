@@ -0,0 +1,37 @@
+import re
+
+# Function words that are frequent in one language and rare in the other
+LANGUAGE_WORDS = {
+    "id": frozenset(
+        """
+        yang dan di ke dari ini itu dengan untuk pada dalam adalah tidak akan juga atau oleh karena sebagai
+        dapat bahwa telah sudah tersebut para lebih secara antara kepada namun hingga bagi seperti agar bisa
+        saat setelah masih belum sangat terhadap yaitu mereka kami kita saya ada
+        """.split()
+    ),
+    "en": frozenset(
+        """
+        the and of to in is that for it with as was on are by this be from or have an which not but at
+        were has had been their they we you its will would can also more about there these than into
+        """.split()
+    ),
+}
+WORD = re.compile(r"[a-z]+")
+
+
+def detect_language(text, candidates, default, sample_chars=2000):
+    """
+    Guess the language of `text` among `candidates` by counting function words
+    in its first `sample_chars` characters. Falls back to `default` when no
+    candidate word is found; ties also go to `default`.
+    """
+    words = WORD.findall(text[:sample_chars].lower())
+    scores = {
+        language: sum(word in LANGUAGE_WORDS[language] for word in words)
+        for language in candidates
+        if language in LANGUAGE_WORDS
+    }
+    best = max(scores, key=lambda language: (scores[language], language == default), default=None)
+    if best is None or scores[best] == 0:
+        return default
+    return best
@@ -1,10 +1,199 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
+import asyncio
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import List, Literal, Optional
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 from fastapi.middleware.cors import CORSMiddleware
-from transformers import AutoTokenizer, AutoModelForTokenClassification, AutoModelForSeq2SeqLM
-import torch
 
-app = FastAPI()
+from cancellation import CancelAbandonedRequests
+from batching import BACKGROUND, INTERACTIVE, MicroBatcher, Overloaded
+from cache import ResultCache, make_key, model_fingerprint
+import metrics
+from inference import CancelStopper, length_sorted, extract_keywords, generate_tag_lists, stream_tag_lists
+from tag_vocab import load_tag_trie
+from language import detect_language
+from registry import ModelRegistry, ModelSpec, load_specs
+from shadow import ShadowComparison
+from singleflight import SingleFlight
+from fallback import load_fallbacks
+from jobs import JobStore, csv_records
+from models import (
+    BACKENDS,
+    ServingModel,
+    load_keyword_model,
+    load_tag_model,
+    inference_device,
+    model_variant,
+    configure_torch_threads,
+    share_for_fork,
+)
+from config import (
+    KEYWORD_MODEL_PATH,
+    TAG_MODEL_PATH,
+    DEFAULT_LANGUAGE,
+    MODEL_REGISTRY_PATH,
+    MODEL_REGISTRY_POLL_SECONDS,
+    ADMIN_TOKEN,
+    MODEL_MEMORY_BUDGET_MB,
+    INFERENCE_BACKEND,
+    PRELOAD_MODELS,
+    KEYWORD_QUANTIZE,
+    TAG_QUANTIZE,
+    MAX_LENGTH,
+    TAG_GENERATION_PARAMS,
+    TAG_STREAM_MAX_BEAMS,
+    TAG_DECODING_PROFILES,
+    TAG_DEFAULT_PROFILE,
+    TAG_DOWNGRADE_QUEUE_DEPTH,
+    TAG_MAX_TAGS,
+    TAG_TRIE_PATH,
+    KEYWORD_WINDOW_STRIDE,
+    KEYWORD_BATCH_SIZE,
+    KEYWORD_BATCH_WAIT_MS,
+    TAG_BATCH_SIZE,
+    TAG_BATCH_WAIT_MS,
+    KEYWORD_MAX_QUEUE,
+    KEYWORD_LATENCY_BUDGET_MS,
+    TAG_MAX_QUEUE,
+    TAG_LATENCY_BUDGET_MS,
+    TORCH_NUM_THREADS,
+    BULK_CHUNK_SIZE,
+    BULK_MAX_IN_FLIGHT,
+    BULK_MAX_RETRY_WAIT_SECONDS,
+    JOBS_DIR,
+    JOBS_DATA_DIR,
+    JOBS_CHECKPOINT_RECORDS,
+    JOBS_POLL_SECONDS,
+    FALLBACK_INDEX_DIR,
+    CACHE_MAX_ENTRIES,
+    CACHE_TTL_SECONDS,
+    CACHE_SQLITE_PATH,
+    WARMUP_BATCH_SIZE,
+    WARMUP_TEXT,
+)
+
+if INFERENCE_BACKEND not in BACKENDS:
+    raise ValueError(f"Unknown INFERENCE_BACKEND {INFERENCE_BACKEND!r}, expected one of {BACKENDS}")
+if TAG_DEFAULT_PROFILE not in TAG_DECODING_PROFILES:
+    raise ValueError(f"Unknown TAG_DEFAULT_PROFILE {TAG_DEFAULT_PROFILE!r}, expected one of {list(TAG_DECODING_PROFILES)}")
+
+TASKS = ("keyword", "tag")
+
+# Requests are rejected until the default-language models are loaded and `models_ready` is set
+models_ready = threading.Event()
+load_error = None
+
+def warmup(model):
+    """Run a small batch through the model so the first real request skips kernel and allocator warmup."""
+    if WARMUP_BATCH_SIZE <= 0:
+        return
+    texts = [WARMUP_TEXT] * WARMUP_BATCH_SIZE
+    if model.task == "keyword":
+        extract_keywords(model.tokenizer, model.model, texts, False, model.device)
+    else:
+        generate_tag_lists(model.tokenizer, model.model, texts, model.device)
+
+def checkpoint_version(spec):
+    """The version results of `spec` are cached under, known without loading it."""
+    # Backend and quantization are part of the version so A/B runs never share cached results
+    return f"{model_fingerprint(spec.path)}-{model_variant(INFERENCE_BACKEND, spec.quantize)}"
+
+# Set while the pre-fork master loads the default models. Warming up there would run forward
+# passes (and start OpenMP threads) in a process that is about to fork, only for every worker
+# to warm up its own copy again.
+preloading = False
+
+def load_model(spec):
+    """Registry loader: load and warm up one registered checkpoint (warmup is left to workers when preloading)."""
+    device = inference_device(INFERENCE_BACKEND)
+    variant = model_variant(INFERENCE_BACKEND, spec.quantize)
+    version = checkpoint_version(spec)
+    if spec.task == "keyword":
+        tokenizer, model = load_keyword_model(spec.path, INFERENCE_BACKEND, device, spec.quantize)
+        tag_trie = None
+    else:
+        tokenizer, model = load_tag_model(spec.path, INFERENCE_BACKEND, device, spec.quantize)
+        tag_trie = load_tag_trie(spec.tag_trie, tokenizer)
+    serving_model = ServingModel(
+        spec.task, spec.path, tokenizer, model, device, variant, version, tag_trie, spec.key, spec.language
+    )
+    if not preloading:
+        warmup(serving_model)
+    logging.info(f"Loaded {spec.key} from {spec.path}")
+    return serving_model
+
+registry = ModelRegistry(load_model, MODEL_MEMORY_BUDGET_MB * 2**20)
+registry.register(ModelSpec("keyword", DEFAULT_LANGUAGE, "default", KEYWORD_MODEL_PATH, KEYWORD_QUANTIZE))
+registry.register(ModelSpec("tag", DEFAULT_LANGUAGE, "default", TAG_MODEL_PATH, TAG_QUANTIZE, TAG_TRIE_PATH))
+# (spec, shadow_fraction) of registry file entries to shadow once the default models are ready
+startup_shadows = []
+if MODEL_REGISTRY_PATH:
+    for spec, shadow_fraction in load_specs(MODEL_REGISTRY_PATH):
+        registry.register(spec, activate=not shadow_fraction)
+        if shadow_fraction:
+            startup_shadows.append((spec, shadow_fraction))
+
+def load_default_models():
+    """Load the default-language models up front; other languages are loaded on first use."""
+    configure_torch_threads(TORCH_NUM_THREADS)
+    for task in TASKS:
+        registry.release(registry.acquire(task, DEFAULT_LANGUAGE))
+
+def load_in_background():
+    global load_error
+    try:
+        resident = registry.resident()
+        if resident:
+            # Preloaded in the master before fork; only this worker's warmup is left
+            configure_torch_threads(TORCH_NUM_THREADS)
+            for model in resident:
+                warmup(model)
+        else:
+            load_default_models()
+        models_ready.set()
+        logging.info("Models loaded and warmed up")
+        # Registered inactive above, and the registry watcher skips registered keys, so a restart
+        # would otherwise end a shadow comparison that is in progress
+        for spec, shadow_fraction in startup_shadows:
+            if not start_swap(spec, shadow_fraction):
+                logging.warning(f"Not shadowing {spec.key}: another swap for {spec.task}/{spec.language} is loading")
+    except Exception as e:
+        load_error = f"{type(e).__name__}: {e}"
+        logging.exception("Model loading failed")
+
+if PRELOAD_MODELS:
+    if INFERENCE_BACKEND == "onnx":
+        # ONNX Runtime sessions are not fork-safe, so each worker loads its own
+        logging.warning("PRELOAD_MODELS is not supported with INFERENCE_BACKEND=onnx; loading per worker")
+    else:
+        preloading = True
+        try:
+            load_default_models()
+        finally:
+            preloading = False
+        share_for_fork(registry.resident())
+        logging.info("Models preloaded for copy-on-write sharing across forked workers")
+
+@asynccontextmanager
+async def lifespan(app):
+    # Load off the event loop so /health/live answers while weights are loading
+    threading.Thread(target=load_in_background, name="model-loader", daemon=True).start()
+    if MODEL_REGISTRY_PATH and MODEL_REGISTRY_POLL_SECONDS > 0:
+        threading.Thread(target=watch_registry_file, name="registry-watcher", daemon=True).start()
+    jobs_task = asyncio.create_task(run_jobs()) if job_store is not None else None
+    yield
+    if jobs_task is not None:
+        # Running jobs stay "running" on disk and resume from their checkpoint on the next start
+        jobs_task.cancel()
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -15,88 +204,1120 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load models
-keyword_model_path = "./models/best_keyword_model"
-keyword_tokenizer = AutoTokenizer.from_pretrained(keyword_model_path, local_files_only=True)
-keyword_model = AutoModelForTokenClassification.from_pretrained(keyword_model_path, local_files_only=True)
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    # Stage timings collected while the request waits on the model queues
+    timings = {}
+    token = metrics.request_timings.set(timings)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        metrics.request_timings.reset(token)
+    total = time.perf_counter() - start
+    if timings:
+        response.headers["Server-Timing"] = metrics.server_timing_header(timings, total)
+        metrics.observe_request(request.url.path, timings, total)
+    return response
 
-tag_model_path = "./models/best_tag_model"
-tag_tokenizer = AutoTokenizer.from_pretrained(tag_model_path, local_files_only=True)
-tag_model = AutoModelForSeq2SeqLM.from_pretrained(tag_model_path, local_files_only=True)
+# Outermost, so it also stops the middlewares above from waiting on a cancelled handler
+app.add_middleware(CancelAbandonedRequests)
 
-# Device
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-keyword_model.to(device)
-tag_model.to(device)
-
-# Constants
-MAX_LENGTH = 256
-MAX_INPUT_LENGTH = 256
-MAX_TARGET_LENGTH = 100
-PREFIX = "generate tags: "
-id2label = {0: 'O', 1: 'B-KEY', 2: 'I-KEY'}
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request, exc):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": f"Server overloaded: {exc.reason}"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 # Input Models
 class TextInput(BaseModel):
     text: str
 
-# === Endpoint: Generate Keywords ===
-@app.post("/generate_keywords")
-def generate_keywords(input: TextInput):
-    inputs = keyword_tokenizer(input.text, return_tensors="pt", max_length=MAX_LENGTH, padding="max_length", truncation=True)
-    inputs = {k: v.to(device) for k, v in inputs.items()}
+class BatchTextInput(BaseModel):
+    texts: List[str]
+
+class KeywordInput(TextInput):
+    sliding_window: bool = False
+    language: Optional[str] = None
+
+class BatchKeywordInput(BatchTextInput):
+    sliding_window: bool = False
+    language: Optional[str] = None
+
+class TagInput(TextInput):
+    profile: Optional[str] = None
+    latency_budget_ms: Optional[float] = Field(None, gt=0)
+    num_tags: int = Field(10, ge=1, le=TAG_MAX_TAGS)
+    constrained: bool = False
+    language: Optional[str] = None
+
+class BatchTagInput(BatchTextInput):
+    profile: Optional[str] = None
+    latency_budget_ms: Optional[float] = Field(None, gt=0)
+    num_tags: int = Field(10, ge=1, le=TAG_MAX_TAGS)
+    constrained: bool = False
+    language: Optional[str] = None
+
+class TagStreamInput(TextInput):
+    num_tags: int = Field(10, ge=1, le=TAG_MAX_TAGS)
+    constrained: bool = False
+    num_beams: int = Field(1, ge=1, le=TAG_STREAM_MAX_BEAMS)
+    format: Literal["sse", "ndjson"] = "sse"
+    language: Optional[str] = None
+
+class AnalyzeInput(BaseModel):
+    title: str
+    content: str
+    sliding_window: bool = False
+    profile: Optional[str] = None
+    latency_budget_ms: Optional[float] = Field(None, gt=0)
+    num_tags: int = Field(10, ge=1, le=TAG_MAX_TAGS)
+    constrained: bool = False
+    language: Optional[str] = None
+
+# === Inference helpers ===
+def run_keyword_batch(texts, key, timings, abandoned):
+    # key is (model_key, sliding_window). A single forward pass, so `abandoned` is not polled;
+    # abandoned items were already dropped from the queue.
+    model_key, sliding_window = key
+    keyword = registry.get(model_key)
+    return extract_keywords(keyword.tokenizer, keyword.model, texts, sliding_window, keyword.device, timings)
+
+def stream_generation_params(num_beams):
+    return {**TAG_GENERATION_PARAMS, "num_beams": num_beams, "early_stopping": num_beams > 1}
+
+class TagRequest:
+    """One text queued for the tag model; `on_tag` is only set for streaming requests."""
+    __slots__ = ("text", "num_tags", "on_tag")
+
+    def __init__(self, text, num_tags, on_tag=None):
+        self.text = text
+        self.num_tags = num_tags
+        self.on_tag = on_tag
+
+def run_tag_batch(items, key, timings, abandoned):
+    # key is (model_key, "profile", profile_name, constrained) or (model_key, "stream", num_beams, constrained)
+    model_key, mode, setting, constrained = key
+    tag = registry.get(model_key)
+    texts = [item.text for item in items]
+    num_tags = [item.num_tags for item in items]
+    tag_trie = tag.tag_trie if constrained else None
+    # Beam search stops between decoder steps once every caller of the batch has gone away
+    stopping_criteria = [CancelStopper(abandoned)]
+    if mode == "stream":
+        callbacks = [item.on_tag for item in items]
+        return stream_tag_lists(
+            tag.tokenizer, tag.model, texts, callbacks, num_tags, tag.device, stream_generation_params(setting),
+            timings, tag_trie, stopping_criteria,
+        )
+    return generate_tag_lists(
+        tag.tokenizer, tag.model, texts, tag.device, TAG_DECODING_PROFILES[setting], stopping_criteria,
+        timings=timings, num_tags=num_tags, tag_trie=tag_trie,
+    )
+
+# One bounded executor per task; batch keys include the model, so languages never share a forward pass
+keyword_batcher = MicroBatcher(
+    "keyword", run_keyword_batch, KEYWORD_BATCH_SIZE, KEYWORD_BATCH_WAIT_MS, KEYWORD_MAX_QUEUE, KEYWORD_LATENCY_BUDGET_MS,
+    observer=metrics.observe_batch,
+)
+tag_batcher = MicroBatcher(
+    "tag", run_tag_batch, TAG_BATCH_SIZE, TAG_BATCH_WAIT_MS, TAG_MAX_QUEUE, TAG_LATENCY_BUDGET_MS,
+    observer=metrics.observe_batch,
+)
+
+result_cache = ResultCache(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS, CACHE_SQLITE_PATH or None)
+metrics.register_runtime_collector(result_cache, [keyword_batcher, tag_batcher])
+# Memory-mapped, so pre-forked workers share the pages
+keyword_fallback, tag_fallback = load_fallbacks(FALLBACK_INDEX_DIR)
 
-    with torch.no_grad():
-        logits = keyword_model(**inputs).logits
+def keyword_cache_params(sliding_window):
+    params = {"max_length": MAX_LENGTH, "sliding_window": sliding_window, "decoding": "offsets"}
+    if sliding_window:
+        params["stride"] = KEYWORD_WINDOW_STRIDE
+    return params
 
-    predictions_ids = torch.argmax(logits, dim=2)
-    input_tokens = keyword_tokenizer.convert_ids_to_tokens(inputs["input_ids"].squeeze().tolist())
+def require_ready():
+    if not models_ready.is_set():
+        raise HTTPException(status_code=503, detail="Models are still loading", headers={"Retry-After": "5"})
 
-    extracted_keywords = []
-    current_keyword_tokens = []
-    for token, pred_id in zip(input_tokens, predictions_ids.squeeze().tolist()):
-        if token in [keyword_tokenizer.cls_token, keyword_tokenizer.sep_token, keyword_tokenizer.pad_token]:
+def require_batch_size(texts, batcher, bulk_path):
+    """
+    Reject batches larger than the batcher's queue; they are admitted whole, so
+    one request could otherwise hold any number of texts in memory at once.
+    """
+    if batcher.max_queue and len(texts) > batcher.max_queue:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {batcher.max_queue} texts per batch; send larger inputs to {bulk_path}",
+        )
+
+def request_language(task, language, text):
+    """The explicit language if a model serves it, otherwise the language detected from the text."""
+    languages = registry.languages(task)
+    if language is None:
+        return detect_language(text, languages, DEFAULT_LANGUAGE)
+    if language not in languages:
+        raise HTTPException(
+            status_code=422, detail=f"No {task} model for language {language!r}, expected one of {languages}"
+        )
+    return language
+
+async def acquire_model(task, language):
+    model = registry.try_acquire(task, language)
+    if model is None:
+        # Not resident yet: load (and possibly evict) off the event loop
+        model = await asyncio.to_thread(registry.acquire, task, language)
+    return model
+
+@asynccontextmanager
+async def holding_model(task, language):
+    model = await acquire_model(task, language)
+    try:
+        yield model
+    finally:
+        registry.release(model)
+
+# Identical inputs being computed right now, shared by both batchers (cache keys include the model name)
+in_flight = SingleFlight()
+
+async def cache_version(task, language):
+    """
+    (version, model) for the active model of (task, language): the version its
+    results are cached under, and the model itself if it is resident. Known
+    without loading it, so requests the cache can answer never load or evict one.
+    """
+    key = registry.resolve(task, language)
+    model = registry.peek(key)
+    if model is not None:
+        return model.version, model
+    # Fingerprinting lists and stats the checkpoint directory; not memoized, so a checkpoint
+    # retrained while unloaded is never served results of the old weights
+    return await asyncio.to_thread(checkpoint_version, registry.spec(key)), None
+
+async def lookup_cached(batcher, texts, version, params):
+    """
+    Look `texts` up in the result cache before holding a model. Returns
+    (results, found): results is None unless every text was cached, and found
+    maps the cache keys that were to their results.
+    """
+    cache_keys = [make_key(batcher.name, text, version, params) for text in texts]
+    found = await result_cache.lookup(list(dict.fromkeys(cache_keys)))
+    if len(found) < len(set(cache_keys)):
+        return None, found
+    return [found[cache_key] for cache_key in cache_keys], found
+
+async def run_batched(
+    batcher, texts, key=None, version=None, params=None, items=None, priority=INTERACTIVE, use_cache=True, found=None
+):
+    """
+    Serve what the result cache already has, wait on identical inputs other
+    requests are already computing, and send the rest through the batcher.
+    Repeated texts within one call are computed once. If the caller is
+    cancelled, inputs no other request waits for are abandoned. `items` are what gets
+    queued for each text (the texts themselves by default). Background
+    results are not cached, so a long job cannot flush the entries
+    interactive traffic hits; `use_cache=False` skips the cache altogether.
+    `found` is a `lookup_cached` result for the same texts and version, so
+    they are not looked up twice.
+    """
+    items = texts if items is None else items
+    cache_keys = [make_key(batcher.name, text, version, params) for text in texts]
+    if found is None:
+        found = await result_cache.lookup(list(dict.fromkeys(cache_keys))) if use_cache else {}
+    found = dict(found)
+    flights, misses = {}, {}
+    for i, cache_key in enumerate(cache_keys):
+        if cache_key in found or cache_key in flights or cache_key in misses:
             continue
-        label = id2label[pred_id]
-        if label == 'B-KEY':
-            if current_keyword_tokens:
-                extracted_keywords.append(keyword_tokenizer.convert_tokens_to_string(current_keyword_tokens))
-                current_keyword_tokens = []
-            current_keyword_tokens.append(token)
-        elif label == 'I-KEY' and current_keyword_tokens:
-            current_keyword_tokens.append(token)
+        flight = in_flight.join(cache_key, priority)
+        if flight is not None:
+            flights[cache_key] = flight
         else:
-            if current_keyword_tokens:
-                extracted_keywords.append(keyword_tokenizer.convert_tokens_to_string(current_keyword_tokens))
-                current_keyword_tokens = []
-    if current_keyword_tokens:
-        extracted_keywords.append(keyword_tokenizer.convert_tokens_to_string(current_keyword_tokens))
+            misses[cache_key] = i
+    if flights:
+        metrics.DEDUPLICATED_INPUTS.labels(batcher.name).inc(len(flights))
+    cache_hits = sum(cache_key in found for cache_key in cache_keys)
+
+    missed = list(misses.values())
+    order = [missed[i] for i in length_sorted([texts[i] for i in missed])]
+    futures = batcher.submit_many([items[i] for i in order], key, priority)
+    # No await since the joins above, so no other request can have started the same inputs meanwhile
+    for i, future in zip(order, futures):
+        flights[cache_keys[i]] = in_flight.start(cache_keys[i], future, priority, batcher)
+    computed = await asyncio.gather(*[in_flight.wait(flight) for flight in flights.values()])
+    metrics.record_request_timings(batcher.name, [flight.future.timings for flight in flights.values()], cache_hits)
+    for cache_key, result in zip(flights, computed):
+        if cache_key in misses and priority == INTERACTIVE and use_cache:
+            result_cache.set(cache_key, result)
+        found[cache_key] = result
+    return [found[cache_key] for cache_key in cache_keys]
+
+async def run_by_language(task, texts, language, run_group):
+    """
+    Route every text to the model for its language and run the language
+    groups concurrently. `run_group(language, texts)` returns (results, degraded).
+    """
+    groups = {}
+    for i, text in enumerate(texts):
+        groups.setdefault(request_language(task, language, text), []).append(i)
+    outputs = await asyncio.gather(
+        *[run_group(group_language, [texts[i] for i in indices]) for group_language, indices in groups.items()]
+    )
+    results = [None] * len(texts)
+    degraded = False
+    for indices, (group_results, group_degraded) in zip(groups.values(), outputs):
+        degraded = degraded or group_degraded
+        for i, result in zip(indices, group_results):
+            results[i] = result
+    return results, degraded
+
+def degraded_results(model, fallback, texts, *args):
+    """Answer from the statistical fallback instead of the overloaded model."""
+    metrics.DEGRADED_RESULTS.labels(model).inc(len(texts))
+    return [fallback.extract(text, *args) for text in texts]
+
+# (task, language) -> ShadowComparison for a loaded candidate that receives mirrored traffic
+shadows = {}
+background_tasks = set()
+
+def shadow_candidate(task, language, results, seconds, run):
+    """
+    On a sampled share of requests, replay the same inputs on the shadowed
+    candidate in the background. `run(model, priority, use_cache)` is the
+    request's own run function; replays are queued at BACKGROUND priority, so
+    they never count toward admission of real requests, and bypass the cache.
+    """
+    shadow = shadows.get((task, language))
+    if shadow is None or not shadow.sampled():
+        return
+
+    async def compare():
+        # Keep the replay out of the original request's Server-Timing
+        metrics.request_timings.set(None)
+        model = registry.try_hold(shadow.model.key)
+        if model is None:
+            return
+        start = time.perf_counter()
+        try:
+            candidate_results = await run(model, BACKGROUND, False)
+        except Overloaded:
+            # Skipped under load rather than held against the candidate
+            return
+        except Exception:
+            shadow.record_failure()
+            return
+        finally:
+            registry.release(model)
+        shadow.record(seconds, time.perf_counter() - start, results, candidate_results)
+
+    replay = asyncio.create_task(compare())
+    background_tasks.add(replay)
+    replay.add_done_callback(background_tasks.discard)
+
+async def run_keyword_group(language, texts, sliding_window, degrade=True, priority=INTERACTIVE):
+    params = keyword_cache_params(sliding_window)
+
+    async def run(model, priority=priority, use_cache=True, found=None):
+        return await run_batched(
+            keyword_batcher, texts, (model.key, sliding_window), model.version, params,
+            priority=priority, use_cache=use_cache, found=found,
+        )
+
+    version, _ = await cache_version("keyword", language)
+    cached, found = await lookup_cached(keyword_batcher, texts, version, params)
+    if cached is not None:
+        return cached, False
+    async with holding_model("keyword", language) as model:
+        start = time.perf_counter()
+        try:
+            # A different version was loaded or activated meanwhile; run_batched looks it up itself
+            results = await run(model, found=found if model.version == version else None)
+        except Overloaded:
+            if keyword_fallback is None or not degrade:
+                raise
+            return degraded_results("keyword", keyword_fallback, texts), True
+    shadow_candidate("keyword", language, results, time.perf_counter() - start, run)
+    return results, False
+
+async def run_keywords(texts, sliding_window, language=None, degrade=True, priority=INTERACTIVE):
+    """
+    Returns (results, degraded); degraded results come from the TF-IDF
+    fallback. With `degrade=False`, Overloaded propagates instead.
+    """
+    require_ready()
+    return await run_by_language(
+        "keyword", texts, language,
+        lambda group_language, group: run_keyword_group(group_language, group, sliding_window, degrade, priority),
+    )
+
+PROFILE_ORDER = list(TAG_DECODING_PROFILES)
+
+def estimated_tag_latency(profile, language, constrained=False):
+    batch_seconds = tag_batcher.batch_seconds((registry.resolve("tag", language), "profile", profile, constrained))
+    if batch_seconds is None:
+        return 0.0
+    return tag_batcher.expected_wait() + batch_seconds
+
+def requested_tag_profile(requested):
+    profile = requested or TAG_DEFAULT_PROFILE
+    if profile not in TAG_DECODING_PROFILES:
+        raise HTTPException(status_code=422, detail=f"Unknown profile {profile!r}, expected one of {PROFILE_ORDER}")
+    return profile
+
+def choose_tag_profile(requested, latency_budget_ms, language=DEFAULT_LANGUAGE, constrained=False):
+    """
+    Start from the requested profile and step down to cheaper ones while the
+    tag queue is deep or the estimated latency would exceed the caller's budget.
+    """
+    profile = requested_tag_profile(requested)
+    index = PROFILE_ORDER.index(profile)
+    last = len(PROFILE_ORDER) - 1
+    if TAG_DOWNGRADE_QUEUE_DEPTH:
+        index = min(last, index + tag_batcher.queue_depth(INTERACTIVE) // TAG_DOWNGRADE_QUEUE_DEPTH)
+    if latency_budget_ms:
+        while (
+            index < last
+            and estimated_tag_latency(PROFILE_ORDER[index], language, constrained) > latency_budget_ms / 1000
+        ):
+            index += 1
+    return PROFILE_ORDER[index]
+
+def tag_constraint_params(model, constrained):
+    """Cache params for constrained decoding; the trie version keeps results from an older vocabulary apart."""
+    if not constrained:
+        return {}
+    if model.tag_trie is None:
+        raise HTTPException(
+            status_code=422, detail=f"Constrained decoding is not available: no tag trie is loaded for {model.key}"
+        )
+    return {"constrained": model.tag_trie.version}
+
+async def run_tag_group(language, texts, profile, num_tags, constrained, degrade=True, priority=INTERACTIVE):
+    items = [TagRequest(text, num_tags) for text in texts]
+
+    def cache_params(model):
+        return {**TAG_DECODING_PROFILES[profile], "num_tags": num_tags, **tag_constraint_params(model, constrained)}
+
+    async def run(model, priority=priority, use_cache=True, found=None):
+        return await run_batched(
+            tag_batcher, texts, (model.key, "profile", profile, constrained), model.version, cache_params(model), items,
+            priority, use_cache, found,
+        )
+
+    version, resident = await cache_version("tag", language)
+    looked_up = found = None
+    # The trie version in constrained cache params is only known once the model is loaded
+    if not constrained or resident is not None:
+        looked_up = (version, cache_params(resident))
+        cached, found = await lookup_cached(tag_batcher, texts, *looked_up)
+        if cached is not None:
+            return cached, False
+    async with holding_model("tag", language) as model:
+        start = time.perf_counter()
+        try:
+            reuse = (model.version, cache_params(model)) == looked_up
+            results = await run(model, found=found if reuse else None)
+        except Overloaded:
+            if tag_fallback is None or not degrade:
+                raise
+            return degraded_results("tag", tag_fallback, texts, num_tags), True
+    shadow_candidate("tag", language, results, time.perf_counter() - start, run)
+    return results, False
+
+async def run_tags(texts, profile, num_tags, constrained=False, language=None, degrade=True, priority=INTERACTIVE):
+    """
+    Returns (results, degraded); degraded results come from the tag
+    co-occurrence fallback. With `degrade=False`, Overloaded propagates instead.
+    """
+    require_ready()
+    return await run_by_language(
+        "tag", texts, language,
+        lambda group_language, group: run_tag_group(
+            group_language, group, profile, num_tags, constrained, degrade, priority
+        ),
+    )
+
+# === Endpoint: Generate Keywords ===
+@app.post("/generate_keywords")
+async def generate_keywords(input: KeywordInput):
+    results, degraded = await run_keywords([input.text], input.sliding_window, input.language)
+    return {**results[0], "degraded": degraded}
 
-    final_keywords = list(dict.fromkeys(extracted_keywords))[:10]
-    return {"keywords": final_keywords}
+# === Endpoint: Generate Keywords (Batch) ===
+@app.post("/generate_keywords_batch")
+async def generate_keywords_batch(input: BatchKeywordInput):
+    require_batch_size(input.texts, keyword_batcher, "/generate_keywords/bulk")
+    results, degraded = await run_keywords(input.texts, input.sliding_window, input.language)
+    return {"results": results, "degraded": degraded}
 
 # === Endpoint: Generate Tags ===
 @app.post("/generate_tags")
-def generate_tags(input: TextInput):
-    combined_text = PREFIX + input.text
-    inputs = tag_tokenizer(
-        combined_text,
-        return_tensors="pt",
-        max_length=MAX_INPUT_LENGTH,
-        truncation=True,
-        padding="max_length"
-    ).to(device)
-
-    with torch.no_grad():
-        output = tag_model.generate(
-            input_ids=inputs["input_ids"],
-            attention_mask=inputs["attention_mask"],
-            max_length=MAX_TARGET_LENGTH + 10,
-            num_beams=5,
-            early_stopping=True,
-            no_repeat_ngram_size=2
-        )
+async def generate_tags(input: TagInput):
+    language = request_language("tag", input.language, input.text)
+    profile = choose_tag_profile(input.profile, input.latency_budget_ms, language, input.constrained)
+    results, degraded = await run_tags([input.text], profile, input.num_tags, input.constrained, language)
+    return {"tags": results[0], "profile": profile, "language": language, "degraded": degraded}
+
+# === Endpoint: Generate Tags (Batch) ===
+@app.post("/generate_tags_batch")
+async def generate_tags_batch(input: BatchTagInput):
+    require_batch_size(input.texts, tag_batcher, "/generate_tags/bulk")
+    # Profile latency is estimated for the explicit language; texts are still routed one by one
+    if input.language is not None:
+        request_language("tag", input.language, "")
+    profile = choose_tag_profile(
+        input.profile, input.latency_budget_ms, input.language or DEFAULT_LANGUAGE, input.constrained
+    )
+    results, degraded = await run_tags(input.texts, profile, input.num_tags, input.constrained, input.language)
+    return {"results": [{"tags": tags} for tags in results], "profile": profile, "degraded": degraded}
+
+# === Endpoint: Generate Tags (Streaming) ===
+STREAM_MEDIA_TYPES = {"sse": "text/event-stream", "ndjson": "application/x-ndjson"}
+
+def stream_event(fmt, event, data):
+    if fmt == "sse":
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return json.dumps({"event": event, **data}, ensure_ascii=False) + "\n"
+
+@app.post("/generate_tags/stream")
+async def generate_tags_stream(input: TagStreamInput):
+    """
+    Emit each tag as soon as it is complete, then a final `done` event with the
+    full list. With num_beams > 1 the tag events are held until generation ends,
+    since a finished beam can still overtake the live ones.
+    """
+    require_ready()
+    language = request_language("tag", input.language, input.text)
+
+    def stream_cache_key(model, version):
+        params = {
+            **stream_generation_params(input.num_beams),
+            "num_tags": input.num_tags,
+            **tag_constraint_params(model, input.constrained),
+        }
+        return make_key(tag_batcher.name, input.text, version, params)
+
+    done = object()
+    queue = asyncio.Queue()
+    submitted = future = None
+    degraded = False
+    cache_key = cached = None
+    # Answer from the cache before holding the model, so a hit never loads one
+    version, resident = await cache_version("tag", language)
+    if not input.constrained or resident is not None:
+        cache_key = stream_cache_key(resident, version)
+        cached = (await result_cache.lookup([cache_key])).get(cache_key)
+    if cached is None:
+        model = await acquire_model("tag", language)
+        try:
+            held_key = stream_cache_key(model, model.version)
+            if held_key != cache_key:
+                # Loaded or activated meanwhile, or constrained params only known now
+                cache_key = held_key
+                cached = (await result_cache.lookup([cache_key])).get(cache_key)
+            if cached is None:
+                loop = asyncio.get_running_loop()
+                on_tag = lambda tag: loop.call_soon_threadsafe(queue.put_nowait, tag)
+                request = TagRequest(input.text, input.num_tags, on_tag)
+                key = (model.key, "stream", input.num_beams, input.constrained)
+                try:
+                    submitted = tag_batcher.submit(request, key)
+                    future = asyncio.wrap_future(submitted)
+                    future.add_done_callback(lambda _: queue.put_nowait(done))
+                except Overloaded:
+                    if tag_fallback is None:
+                        raise
+                    cached = degraded_results("tag", tag_fallback, [input.text], input.num_tags)[0]
+                    degraded = True
+        finally:
+            # Only the queued batch still needs the model; hold it until that has run
+            if future is None:
+                registry.release(model)
+            else:
+                future.add_done_callback(lambda _: registry.release(model))
+
+    async def events():
+        emitted = []
+        tags = cached
+        if future is not None:
+            try:
+                while (tag := await queue.get()) is not done:
+                    emitted.append(tag)
+                    yield stream_event(input.format, "tag", {"tag": tag})
+            finally:
+                if not future.done():
+                    # The client went away mid-stream; stop decoding for it
+                    tag_batcher.abandon(submitted)
+            try:
+                tags = future.result()
+            except Exception as e:
+                yield stream_event(input.format, "error", {"detail": str(e)})
+                return
+            result_cache.set(cache_key, tags)
+        # Tags the streamer could not confirm early (beam disagreement, last tag before EOS)
+        for tag in tags:
+            if tag and tag not in emitted:
+                emitted.append(tag)
+                yield stream_event(input.format, "tag", {"tag": tag})
+        yield stream_event(input.format, "done", {"tags": tags, "degraded": degraded})
+
+    return StreamingResponse(events(), media_type=STREAM_MEDIA_TYPES[input.format])
+
+# === Endpoint: Analyze (Keywords + Tags) ===
+def tag_input_text(title, content):
+    # Same format the frontend sends to /generate_tags
+    return f"judul: {title} konten: {content}"
+
+async def timed(coro):
+    start = time.perf_counter()
+    result = await coro
+    return result, round((time.perf_counter() - start) * 1000, 2)
+
+@app.post("/analyze")
+async def analyze(input: AnalyzeInput):
+    start = time.perf_counter()
+    tag_text = tag_input_text(input.title, input.content)
+    language = request_language("tag", input.language, tag_text)
+    profile = choose_tag_profile(input.profile, input.latency_budget_ms, language, input.constrained)
+    # Both models run at the same time on their own executors
+    ((keywords, keywords_degraded), keywords_ms), ((tags, tags_degraded), tags_ms) = await asyncio.gather(
+        timed(run_keywords([input.content], input.sliding_window, input.language)),
+        timed(run_tags([tag_text], profile, input.num_tags, input.constrained, language)),
+    )
+    return {
+        "keywords": keywords[0]["keywords"],
+        "keyword_spans": keywords[0]["spans"],
+        "tags": tags[0],
+        "profile": profile,
+        "language": language,
+        "degraded": keywords_degraded or tags_degraded,
+        "timings_ms": {
+            "keywords": keywords_ms,
+            "tags": tags_ms,
+            "total": round((time.perf_counter() - start) * 1000, 2),
+        },
+    }
+
+# === Endpoint: Bulk (NDJSON) ===
+try:
+    import orjson
+
+    def ndjson_line(record):
+        return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+
+    parse_json = orjson.loads
+except ImportError:
+    # Same output, just slower; install orjson for large bulk jobs
+    def ndjson_line(record):
+        return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+    parse_json = json.loads
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body generator keeps reading the request body.
+
+    Below ASGI spec 2.4, StreamingResponse runs a disconnect listener that
+    consumes `receive()` and would swallow the request body chunks; here the
+    generator's own `request.stream()` sees the disconnect instead.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+async def ndjson_records(request):
+    """Parse the request body one line at a time; malformed lines become error records instead of failing the stream."""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield parse_record(line)
+    if buffer.strip():
+        yield parse_record(buffer)
+
+def parse_record(line):
+    try:
+        record = parse_json(line)
+    except ValueError as e:
+        return {"id": None, "error": f"Invalid JSON: {e}"}
+    if not isinstance(record, dict) or not isinstance(record.get("text"), str):
+        return {"id": record.get("id") if isinstance(record, dict) else None, "error": "Expected {\"id\", \"text\"}"}
+    return record
+
+async def run_bulk_chunk(records, run):
+    """
+    Run one chunk, waiting out Overloaded instead of failing or degrading a
+    pipeline job. Returns (output lines, number of records that failed).
+    """
+    texts = [record["text"] for record in records]
+    while True:
+        try:
+            results = await run(texts)
+            break
+        except Overloaded as e:
+            await asyncio.sleep(min(e.retry_after, BULK_MAX_RETRY_WAIT_SECONDS))
+        except Exception as e:
+            # The response is already streaming; report the failure on the chunk's records
+            error = e.detail if isinstance(e, HTTPException) else f"{type(e).__name__}: {e}"
+            return b"".join(ndjson_line({"id": record.get("id"), "error": error}) for record in records), len(records)
+    return b"".join(ndjson_line({"id": record.get("id"), **result}) for record, result in zip(records, results)), 0
+
+def bulk_response(request, run):
+    """
+    Stream `{id, text}` NDJSON records in and result records out. Records are
+    grouped into BULK_CHUNK_SIZE chunks with at most BULK_MAX_IN_FLIGHT chunks
+    running; reading the body pauses while that many are running, so memory
+    stays bounded however large the upload is. Output lines are written as
+    chunks finish, so their order can differ from the input's. The runners
+    queue chunks at BACKGROUND priority, so a pipeline streaming through here
+    never gets interactive requests rejected or their tag profile downgraded.
+    """
+    async def lines():
+        in_flight = set()
+        chunk = []
+
+        async def finished(wait_for_one):
+            nonlocal in_flight
+            if not in_flight:
+                return []
+            if wait_for_one:
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            else:
+                done = {task for task in in_flight if task.done()}
+                in_flight -= done
+            return [task.result()[0] for task in done]
+
+        try:
+            async for record in ndjson_records(request):
+                if "error" in record:
+                    yield ndjson_line(record)
+                    continue
+                chunk.append(record)
+                if len(chunk) < BULK_CHUNK_SIZE:
+                    continue
+                in_flight.add(asyncio.ensure_future(run_bulk_chunk(chunk, run)))
+                chunk = []
+                for output in await finished(wait_for_one=len(in_flight) >= BULK_MAX_IN_FLIGHT):
+                    yield output
+            if chunk:
+                in_flight.add(asyncio.ensure_future(run_bulk_chunk(chunk, run)))
+            while in_flight:
+                for output in await finished(wait_for_one=True):
+                    yield output
+        finally:
+            # The client went away or the handler was cancelled: stop the chunks still running
+            for task in in_flight:
+                task.cancel()
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
+    return DuplexStreamingResponse(lines(), media_type="application/x-ndjson")
+
+def keyword_bulk_runner(sliding_window, language, priority=BACKGROUND):
+    async def run(texts):
+        results, _ = await run_keywords(texts, sliding_window, language, degrade=False, priority=priority)
+        return results
+    return run
+
+def tag_bulk_runner(profile, num_tags, constrained, language, priority=BACKGROUND):
+    async def run(texts):
+        results, _ = await run_tags(texts, profile, num_tags, constrained, language, degrade=False, priority=priority)
+        return [{"tags": tags} for tags in results]
+    return run
+
+@app.post("/generate_keywords/bulk")
+async def generate_keywords_bulk(request: Request, sliding_window: bool = False, language: Optional[str] = None):
+    require_ready()
+    if language is not None:
+        request_language("keyword", language, "")
+    return bulk_response(request, keyword_bulk_runner(sliding_window, language))
+
+@app.post("/generate_tags/bulk")
+async def generate_tags_bulk(
+    request: Request,
+    profile: Optional[str] = None,
+    num_tags: int = Query(10, ge=1, le=TAG_MAX_TAGS),
+    constrained: bool = False,
+    language: Optional[str] = None,
+):
+    require_ready()
+    if language is not None:
+        request_language("tag", language, "")
+    # Never downgraded: a queue snapshot taken at the start should not decide the profile of a whole stream
+    profile = requested_tag_profile(profile)
+    response = bulk_response(request, tag_bulk_runner(profile, num_tags, constrained, language))
+    response.headers["X-Tag-Profile"] = profile
+    return response
+
+# === Endpoint: Jobs (Asynchronous Bulk) ===
+# Jobs outlive requests and worker restarts; see jobs.py for the on-disk layout
+job_store = JobStore(JOBS_DIR) if JOBS_DIR else None
+# Set when this worker queues a job, so its runner starts it without waiting for the next poll
+jobs_wakeup = asyncio.Event()
+
+def require_jobs():
+    if job_store is None:
+        raise HTTPException(status_code=404, detail="Jobs are disabled (JOBS_DIR is empty)")
+    return job_store
+
+def get_job(job_id):
+    try:
+        return require_jobs().get(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"No job {job_id!r}")
+
+def job_status(job):
+    status = {name: value for name, value in job.items() if name != "input_offset"}
+    status["progress"] = round(job["processed"] / job["total"], 4) if job["total"] else None
+    return status
+
+def job_source_path(source):
+    """A processed CSV inside JOBS_DATA_DIR; names that resolve outside of it are rejected."""
+    data_dir = os.path.realpath(JOBS_DATA_DIR)
+    path = os.path.realpath(os.path.join(data_dir, source))
+    if os.path.dirname(path) != data_dir or not path.endswith(".csv") or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"No processed CSV {source!r} in the jobs data directory")
+    return path
+
+async def receive_job_input(request, job):
+    """Copy an uploaded NDJSON body into the job's input as it arrives; returns the number of records."""
+    total, tail = 0, b""
+    f = await asyncio.to_thread(open, job_store.input_path(job), "wb")
+    try:
+        async for chunk in request.stream():
+            await asyncio.to_thread(f.write, chunk)
+            *lines, tail = (tail + chunk).split(b"\n")
+            total += sum(1 for line in lines if line.strip())
+        if tail.strip():
+            await asyncio.to_thread(f.write, b"\n")
+            total += 1
+    finally:
+        await asyncio.to_thread(f.close)
+    return total
+
+async def submit_job(request, task, source, options):
+    store = require_jobs()
+    path = job_source_path(source) if source else None
+    job = await asyncio.to_thread(store.create, task, source or "upload", options)
+    try:
+        if path:
+            job["total"] = await asyncio.to_thread(store.write_input, job, csv_records(task, path))
+        else:
+            job["total"] = await receive_job_input(request, job)
+    except BaseException:
+        await asyncio.to_thread(store.delete, job["id"])
+        raise
+    job["status"] = "queued"
+    await asyncio.to_thread(store.save, job)
+    await asyncio.to_thread(store.unlock, job["id"])
+    jobs_wakeup.set()
+    return job_status(job)
+
+def job_runner(job):
+    options = job["options"]
+    if job["task"] == "keyword":
+        return keyword_bulk_runner(options["sliding_window"], options["language"])
+    return tag_bulk_runner(options["profile"], options["num_tags"], options["constrained"], options["language"])
+
+async def process_job(job):
+    """
+    Run a claimed job from its last checkpoint, one checkpoint of records at a
+    time, at background priority so interactive requests always go first.
+    """
+    run = job_runner(job)
+    semaphore = asyncio.Semaphore(BULK_MAX_IN_FLIGHT)
+
+    async def run_chunk(records):
+        async with semaphore:
+            return await run_bulk_chunk(records, run)
+
+    job["status"] = "running"
+    await asyncio.to_thread(job_store.save, job)
+    while not await asyncio.to_thread(job_store.cancel_requested, job["id"]):
+        lines, offset = await asyncio.to_thread(job_store.read_input, job, JOBS_CHECKPOINT_RECORDS)
+        if not lines:
+            break
+        records = [parse_record(line) for line in lines]
+        valid = [record for record in records if "error" not in record]
+        output = [ndjson_line(record) for record in records if "error" in record]
+        failed = len(output)
+        for chunk_output, chunk_failed in await asyncio.gather(
+            *[run_chunk(valid[i:i + BULK_CHUNK_SIZE]) for i in range(0, len(valid), BULK_CHUNK_SIZE)]
+        ):
+            output.append(chunk_output)
+            failed += chunk_failed
+        await asyncio.to_thread(job_store.write_part, job, output)
+        job["parts"] += 1
+        job["processed"] += len(records)
+        job["failed"] += failed
+        job["input_offset"] = offset
+        await asyncio.to_thread(job_store.save, job)
+    if await asyncio.to_thread(job_store.cancel_requested, job["id"]):
+        await asyncio.to_thread(job_store.delete, job["id"])
+        logging.info(f"Job {job['id']} cancelled")
+        return
+    job["status"] = "done"
+    await asyncio.to_thread(job_store.save, job)
+    logging.info(f"Job {job['id']} done: {job['processed']} records, {job['failed']} failed")
+
+async def run_jobs():
+    """Run queued and interrupted jobs one at a time; workers sharing JOBS_DIR each take different jobs."""
+    while not models_ready.is_set():
+        await asyncio.sleep(1)
+    await asyncio.to_thread(job_store.recover)
+    while True:
+        jobs_wakeup.clear()
+        job = await asyncio.to_thread(job_store.claim)
+        if job is None:
+            try:
+                await asyncio.wait_for(jobs_wakeup.wait(), JOBS_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        try:
+            await process_job(job)
+        except Exception as e:
+            logging.exception(f"Job {job['id']} failed")
+            job["status"] = "failed"
+            job["error"] = f"{type(e).__name__}: {e}"
+            await asyncio.to_thread(job_store.save, job)
+        finally:
+            await asyncio.to_thread(job_store.unlock, job["id"])
+
+@app.post("/jobs/keywords", status_code=202)
+async def submit_keyword_job(
+    request: Request, source: Optional[str] = None, sliding_window: bool = False, language: Optional[str] = None
+):
+    """
+    Queue a keyword job over `source` (a CSV in JOBS_DATA_DIR, e.g. etd_usk.csv)
+    or, without `source`, over the `{id, text}` NDJSON request body.
+    """
+    if language is not None:
+        request_language("keyword", language, "")
+    return await submit_job(request, "keyword", source, {"sliding_window": sliding_window, "language": language})
+
+@app.post("/jobs/tags", status_code=202)
+async def submit_tag_job(
+    request: Request,
+    source: Optional[str] = None,
+    profile: Optional[str] = None,
+    num_tags: int = Query(10, ge=1, le=TAG_MAX_TAGS),
+    constrained: bool = False,
+    language: Optional[str] = None,
+):
+    """Queue a tag job; see /jobs/keywords. The profile is fixed for the whole job, never downgraded."""
+    profile = requested_tag_profile(profile)
+    if language is not None:
+        request_language("tag", language, "")
+    options = {"profile": profile, "num_tags": num_tags, "constrained": constrained, "language": language}
+    return await submit_job(request, "tag", source, options)
+
+@app.get("/jobs")
+def list_jobs():
+    return {"jobs": [job_status(job) for job in require_jobs().list()]}
+
+@app.get("/jobs/{job_id}")
+def job_progress(job_id: str):
+    return job_status(get_job(job_id))
+
+@app.get("/jobs/{job_id}/results")
+def job_results(job_id: str):
+    """The results written so far as one gzip NDJSON stream; complete once the job's status is "done"."""
+    job = get_job(job_id)
+    paths = job_store.part_paths(job)
+
+    def parts():
+        for path in paths:
+            with open(path, "rb") as f:
+                while chunk := f.read(2**16):
+                    yield chunk
+
+    return StreamingResponse(
+        parts(),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{job_id}.jsonl.gz"', "X-Job-Status": job["status"]},
+    )
+
+@app.delete("/jobs/{job_id}")
+def delete_job(job_id: str):
+    """Delete a job and its results; a job running in some worker is stopped at its next checkpoint first."""
+    get_job(job_id)
+    if job_store.try_lock(job_id):
+        job_store.delete(job_id)
+        return {"id": job_id, "status": "deleted"}
+    job_store.request_cancel(job_id)
+    return JSONResponse(status_code=202, content={"id": job_id, "status": "cancelling"})
+
+# === Endpoint: Model Info ===
+@app.get("/info")
+def info():
+    return {
+        "backend": INFERENCE_BACKEND,
+        "ready": models_ready.is_set(),
+        "queues": {
+            batcher.name: {"depth": batcher.queue_depth(), "expected_wait_s": round(batcher.expected_wait(), 3)}
+            for batcher in (keyword_batcher, tag_batcher)
+        },
+        "in_flight": len(in_flight),
+        "models": registry.describe(),
+    }
+
+# === Endpoint: Health ===
+@app.get("/health/live")
+def health_live():
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+def health_ready():
+    if models_ready.is_set():
+        return {"status": "ready"}
+    if load_error:
+        return JSONResponse(status_code=503, content={"status": "failed", "error": load_error})
+    return JSONResponse(status_code=503, content={"status": "loading"}, headers={"Retry-After": "5"})
+
+# === Endpoint: Admin (Model Swap) ===
+class ModelRouteInput(BaseModel):
+    task: Literal["keyword", "tag"]
+    language: str = DEFAULT_LANGUAGE
+
+class ModelVersionInput(ModelRouteInput):
+    version: str
+
+class ModelSwapInput(ModelVersionInput):
+    path: str
+    quantize: bool = False
+    tag_trie: Optional[str] = None
+    # Share of live requests mirrored to the candidate; 0 switches traffic as soon as it is warm
+    shadow_fraction: float = Field(0.0, ge=0, le=1)
+
+# (task, language) -> state of the latest swap
+swaps = {}
+swaps_lock = threading.Lock()
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+def promote(task, language, version):
+    """Switch traffic to `version` and unload the previous version once its in-flight requests have drained."""
+    previous = registry.activate(task, language, version)
+    shadow = shadows.pop((task, language), None)
+    if shadow is not None:
+        registry.release(shadow.model)
+        if shadow.model.key != (task, language, version):
+            registry.retire(shadow.model.key)
+    if previous is not None and previous != (task, language, version):
+        registry.retire(previous)
+    swaps[(task, language)] = {"version": version, "state": "active"}
+    logging.info(f"Switched {task}/{language} from {previous} to {version}")
+
+def swap_in_background(spec, shadow_fraction):
+    route = (spec.task, spec.language)
+    try:
+        # Loads and warms up the candidate while the current version keeps serving
+        model = registry.acquire_version(spec.key)
+    except Exception as e:
+        swaps[route] = {"version": spec.version, "state": "failed", "error": f"{type(e).__name__}: {e}"}
+        logging.exception(f"Loading {spec.key} for a swap failed")
+        return
+    if shadow_fraction:
+        previous = shadows.pop(route, None)
+        shadows[route] = ShadowComparison(model, shadow_fraction)
+        if previous is not None:
+            registry.release(previous.model)
+            registry.retire(previous.model.key)
+        swaps[route] = {"version": spec.version, "state": "shadowing"}
+        logging.info(f"Shadowing {spec.key} on {shadow_fraction:.0%} of {spec.task}/{spec.language} requests")
+        return
+    try:
+        promote(spec.task, spec.language, spec.version)
+    finally:
+        registry.release(model)
+
+def start_swap(spec, shadow_fraction=0.0):
+    """Register `spec` and load it in the background; returns False if a swap for that route is still loading."""
+    route = (spec.task, spec.language)
+    with swaps_lock:
+        if swaps.get(route, {}).get("state") == "loading":
+            return False
+        swaps[route] = {"version": spec.version, "state": "loading"}
+    if not registry.is_registered(spec.key):
+        registry.register(spec, activate=False)
+    threading.Thread(target=swap_in_background, args=(spec, shadow_fraction), name="model-swap", daemon=True).start()
+    return True
+
+def watch_registry_file():
+    """Swap in every entry newly added to MODEL_REGISTRY_PATH; unlike /admin, this reaches every worker."""
+    last_mtime = None
+    while True:
+        try:
+            mtime = os.path.getmtime(MODEL_REGISTRY_PATH)
+            if mtime != last_mtime:
+                last_mtime = mtime
+                for spec, shadow_fraction in load_specs(MODEL_REGISTRY_PATH):
+                    if not registry.is_registered(spec.key) and not start_swap(spec, shadow_fraction):
+                        logging.warning(f"Skipping {spec.key}: another swap for {spec.task}/{spec.language} is loading")
+        except Exception:
+            logging.exception("Reading the model registry file failed")
+        time.sleep(MODEL_REGISTRY_POLL_SECONDS)
+
+@app.get("/admin/models", dependencies=[Depends(require_admin)])
+def admin_models():
+    return {
+        "registry": registry.describe(),
+        "swaps": {f"{task}/{language}": state for (task, language), state in swaps.items()},
+        "shadows": {f"{task}/{language}": shadow.describe() for (task, language), shadow in shadows.items()},
+    }
+
+@app.post("/admin/models", status_code=202, dependencies=[Depends(require_admin)])
+def admin_swap_model(input: ModelSwapInput):
+    """Load a new checkpoint in the background, then switch traffic to it (or shadow it first)."""
+    spec = ModelSpec(input.task, input.language, input.version, input.path, input.quantize, input.tag_trie)
+    if registry.is_registered(spec.key):
+        raise HTTPException(status_code=409, detail=f"{spec.key} is already registered; use /admin/models/promote")
+    if not start_swap(spec, input.shadow_fraction):
+        raise HTTPException(status_code=409, detail=f"A swap for {input.task}/{input.language} is still loading")
+    return {"status": "loading", "key": list(spec.key)}
+
+@app.post("/admin/models/promote", dependencies=[Depends(require_admin)])
+def admin_promote_model(input: ModelVersionInput):
+    """Switch to the shadowed candidate now, or load a registered version (e.g. a rollback) and switch to it."""
+    key = (input.task, input.language, input.version)
+    if not registry.is_registered(key):
+        raise HTTPException(status_code=404, detail=f"{key} is not registered")
+    shadow = shadows.get((input.task, input.language))
+    if shadow is not None and shadow.model.key == key:
+        promote(*key)
+        return {"status": "active", "key": list(key)}
+    if not start_swap(registry.spec(key)):
+        raise HTTPException(status_code=409, detail=f"A swap for {input.task}/{input.language} is still loading")
+    return JSONResponse(status_code=202, content={"status": "loading", "key": list(key)})
+
+@app.post("/admin/models/cancel", dependencies=[Depends(require_admin)])
+def admin_cancel_shadow(input: ModelRouteInput):
+    """Stop shadowing and unload the candidate; the active version is untouched."""
+    shadow = shadows.pop((input.task, input.language), None)
+    if shadow is None:
+        raise HTTPException(status_code=404, detail=f"No candidate is being shadowed for {input.task}/{input.language}")
+    registry.release(shadow.model)
+    registry.retire(shadow.model.key)
+    swaps[(input.task, input.language)] = {"version": shadow.model.key[2], "state": "cancelled"}
+    return {"status": "cancelled", "comparison": shadow.describe()}
+
+# === Endpoint: Metrics ===
+@app.get("/metrics")
+def prometheus_metrics():
+    content, content_type = metrics.render()
+    return Response(content=content, media_type=content_type)
 
-    decoded = tag_tokenizer.decode(output[0], skip_special_tokens=True)
-    tag_list = [tag.strip() for tag in decoded.split(',')][:10]
-    return {"tags": tag_list}
+# === Endpoint: Cache Stats ===
+@app.get("/cache/stats")
+def cache_stats():
+    return result_cache.stats()
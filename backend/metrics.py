@@ -0,0 +1,119 @@
+import contextvars
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30)
+
+STAGE_SECONDS = Histogram(
+    "text2tag_stage_seconds",
+    "Time spent per request in each stage (tokenize, inference, postprocess, queue_wait), per endpoint",
+    ["endpoint", "stage"],
+    buckets=LATENCY_BUCKETS,
+)
+INPUT_TOKENS = Histogram(
+    "text2tag_input_tokens",
+    "Input length in tokens after truncation; all windows of a sliding-window text count as one input",
+    ["model"],
+    buckets=(8, 16, 32, 64, 96, 128, 192, 256, 384, 512),
+)
+INPUTS = Counter("text2tag_inputs_total", "Inputs run through a model", ["model"])
+TRUNCATED_INPUTS = Counter(
+    "text2tag_truncated_inputs_total", "Inputs longer than the maximum input length that were truncated", ["model"]
+)
+BATCH_SIZE = Histogram(
+    "text2tag_batch_size", "Requests per executed batch", ["model"], buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+QUEUE_WAIT = Histogram(
+    "text2tag_queue_wait_seconds", "Time a request waited in the model queue", ["model"], buckets=LATENCY_BUCKETS
+)
+DEDUPLICATED_INPUTS = Counter(
+    "text2tag_deduplicated_inputs_total",
+    "Inputs that waited on an identical computation already in flight instead of running again",
+    ["model"],
+)
+CANCELLED_REQUESTS = Counter(
+    "text2tag_cancelled_requests_total",
+    "Requests whose handler was cancelled because the client disconnected or the request deadline passed",
+    ["reason"],
+)
+DEGRADED_RESULTS = Counter(
+    "text2tag_degraded_results_total", "Results served by the statistical fallback because a model was overloaded",
+    ["model"],
+)
+
+# Stage timings of the current request, read by the middleware for Server-Timing
+request_timings = contextvars.ContextVar("request_timings", default=None)
+
+STAGES = ("tokenize", "inference", "postprocess", "queue_wait")
+
+
+def observe_batch(model, batch_size, queue_waits, timings):
+    BATCH_SIZE.labels(model).observe(batch_size)
+    for queue_wait in queue_waits:
+        QUEUE_WAIT.labels(model).observe(queue_wait)
+    lengths = timings.get("input_tokens", [])
+    for length in lengths:
+        INPUT_TOKENS.labels(model).observe(length)
+    INPUTS.labels(model).inc(len(lengths))
+    TRUNCATED_INPUTS.labels(model).inc(timings.get("truncated", 0))
+
+
+def record_request_timings(model, batch_timings, cache_hits=0):
+    """Fold the stage timings of every item a request waited on into the request's Server-Timing entries."""
+    timings = request_timings.get()
+    if timings is None:
+        return
+    for item_timings in batch_timings:
+        for stage in STAGES:
+            if stage in item_timings:
+                name = f"{model}_{stage}"
+                timings[name] = max(timings.get(name, 0.0), item_timings[stage])
+    if cache_hits:
+        timings[f"{model}_cache_hits"] = timings.get(f"{model}_cache_hits", 0) + cache_hits
+
+
+def observe_request(endpoint, timings, total_seconds):
+    for name, value in timings.items():
+        if not name.endswith("_cache_hits"):
+            STAGE_SECONDS.labels(endpoint, name).observe(value)
+    STAGE_SECONDS.labels(endpoint, "total").observe(total_seconds)
+
+
+def server_timing_header(timings, total_seconds):
+    entries = []
+    for name, value in timings.items():
+        if name.endswith("_cache_hits"):
+            entries.append(f'{name};desc="{value}"')
+        else:
+            entries.append(f"{name};dur={value * 1000:.2f}")
+    entries.append(f"total;dur={total_seconds * 1000:.2f}")
+    return ", ".join(entries)
+
+
+class RuntimeCollector:
+    """Expose counters owned by other components (result cache, batch queues) at scrape time."""
+
+    def __init__(self, cache, batchers):
+        self.cache = cache
+        self.batchers = batchers
+
+    def collect(self):
+        stats = self.cache.stats()
+        lookups = CounterMetricFamily("text2tag_cache_lookups", "Result cache lookups", labels=["result"])
+        lookups.add_metric(["hit"], stats["hits"])
+        lookups.add_metric(["miss"], stats["misses"])
+        yield lookups
+
+        depth = GaugeMetricFamily("text2tag_queue_depth", "Requests waiting per model queue", labels=["model"])
+        for batcher in self.batchers:
+            depth.add_metric([batcher.name], batcher.queue_depth())
+        yield depth
+
+
+def register_runtime_collector(cache, batchers):
+    REGISTRY.register(RuntimeCollector(cache, batchers))
+
+
+def render():
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,188 @@
+import fcntl
+import gc
+import logging
+import os
+import shutil
+import tempfile
+
+import torch
+from transformers import AutoTokenizer, AutoModelForTokenClassification, AutoModelForSeq2SeqLM
+
+from cache import model_fingerprint
+
+BACKENDS = ("torch", "onnx")
+ONNX_SUBDIR = "onnx"
+# Fingerprint of the checkpoint an export was made from, stored inside the export
+ONNX_FINGERPRINT_FILE = "source_fingerprint"
+
+
+def _onnx_dir(path):
+    return os.path.join(path, ONNX_SUBDIR)
+
+
+def _export_fingerprint(onnx_dir):
+    try:
+        with open(os.path.join(onnx_dir, ONNX_FINGERPRINT_FILE)) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _load_ort(ort_class, path, **kwargs):
+    """
+    Load an ONNX Runtime model exported from `path`, exporting it on first use.
+
+    The exported graphs are written next to the checkpoint so later starts
+    skip the export. They are tagged with the checkpoint's fingerprint and
+    re-exported when a retrained checkpoint is copied over the same path.
+    Workers starting together serialize on a lock file, and each export is
+    written to a temporary directory and renamed into place, so no worker
+    ever loads half-written graphs.
+    """
+    onnx_dir = _onnx_dir(path)
+    fingerprint = model_fingerprint(path)
+    if _export_fingerprint(onnx_dir) == fingerprint:
+        return ort_class.from_pretrained(onnx_dir, provider="CPUExecutionProvider", **kwargs)
+
+    with open(os.path.join(path, ".onnx.lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        # Another worker may have finished the export while this one waited
+        if _export_fingerprint(onnx_dir) == fingerprint:
+            return ort_class.from_pretrained(onnx_dir, provider="CPUExecutionProvider", **kwargs)
+
+        logging.info(f"Exporting {path} to ONNX in {onnx_dir}")
+        model = ort_class.from_pretrained(
+            path, export=True, provider="CPUExecutionProvider", local_files_only=True, **kwargs
+        )
+        staging = tempfile.mkdtemp(prefix=".onnx-", dir=path)
+        model.save_pretrained(staging)
+        with open(os.path.join(staging, ONNX_FINGERPRINT_FILE), "w") as f:
+            f.write(fingerprint)
+        if os.path.exists(onnx_dir):
+            stale = tempfile.mkdtemp(prefix=".onnx-stale-", dir=path)
+            os.rename(onnx_dir, os.path.join(stale, ONNX_SUBDIR))
+            os.rename(staging, onnx_dir)
+            shutil.rmtree(stale, ignore_errors=True)
+        else:
+            os.rename(staging, onnx_dir)
+    return model
+
+
+def _require_onnx():
+    try:
+        from optimum import onnxruntime
+    except ImportError as e:
+        raise RuntimeError(
+            "INFERENCE_BACKEND=onnx requires `optimum[onnxruntime]` (pip install optimum[onnxruntime])"
+        ) from e
+    return onnxruntime
+
+
+def quantize_int8(model):
+    """Dynamic INT8 quantization of every Linear layer; weights are stored as int8, activations stay fp32."""
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _prepare_torch_model(model, device, quantize):
+    model.eval()
+    if quantize:
+        if device is not None and device.type != "cpu":
+            logging.warning("INT8 dynamic quantization only runs on CPU; serving the fp32 model instead")
+        else:
+            return quantize_int8(model)
+    model.to(device or torch.device("cpu"))
+    return model
+
+
+def load_keyword_model(path, backend="torch", device=None, quantize=False):
+    tokenizer = AutoTokenizer.from_pretrained(path, local_files_only=True)
+    if backend == "onnx":
+        if quantize:
+            logging.warning("INT8 dynamic quantization is only applied on the torch backend")
+        model = _load_ort(_require_onnx().ORTModelForTokenClassification, path)
+    else:
+        model = AutoModelForTokenClassification.from_pretrained(path, local_files_only=True)
+        model = _prepare_torch_model(model, device, quantize)
+    return tokenizer, model
+
+
+def load_tag_model(path, backend="torch", device=None, quantize=False):
+    tokenizer = AutoTokenizer.from_pretrained(path, local_files_only=True)
+    if backend == "onnx":
+        if quantize:
+            logging.warning("INT8 dynamic quantization is only applied on the torch backend")
+        # Separate encoder / decoder / decoder-with-past graphs so beam search reuses the KV cache
+        model = _load_ort(_require_onnx().ORTModelForSeq2SeqLM, path, use_cache=True)
+    else:
+        model = AutoModelForSeq2SeqLM.from_pretrained(path, local_files_only=True)
+        model = _prepare_torch_model(model, device, quantize)
+    return tokenizer, model
+
+
+def model_variant(backend, quantize):
+    """Short label for the execution path, used in cache versions and /info."""
+    if backend == "torch" and quantize:
+        return "torch-int8"
+    return backend
+
+
+def configure_torch_threads(num_threads):
+    """Cap intra-op threads so one worker's forward passes do not oversubscribe the host."""
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+
+
+def share_for_fork(models):
+    """
+    Prepare models loaded in a pre-fork master so workers share them copy-on-write.
+
+    Parameter and buffer storages are moved into shared memory, so the
+    weights stay one physical copy even if a worker ever writes to them.
+    Inference only reads those storages; reference counts live in the small
+    Python tensor objects, not in the weight pages. gc.freeze() then moves
+    everything allocated so far out of the collector's generations, so
+    collections in the workers do not write to those objects' headers and
+    dirty their pages.
+    """
+    for serving_model in models:
+        if isinstance(serving_model.model, torch.nn.Module):
+            serving_model.model.share_memory()
+    gc.collect()
+    gc.freeze()
+
+
+def inference_device(backend):
+    if backend == "onnx":
+        return torch.device("cpu")
+    return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+
+class ServingModel:
+    """A loaded tokenizer/model pair for one task, with the version used to key cached results."""
+
+    def __init__(self, task, path, tokenizer, model, device, variant, version, tag_trie=None, key=None, language=None):
+        self.task = task
+        # Registry key (task, language, version label)
+        self.key = key
+        self.language = language
+        self.path = path
+        self.tokenizer = tokenizer
+        self.model = model
+        self.device = device
+        self.variant = variant
+        self.version = version
+        # Optional known-tag vocabulary for constrained decoding (tag model only)
+        self.tag_trie = tag_trie
+
+    def describe(self):
+        description = {
+            "task": self.task,
+            "language": self.language,
+            "path": self.path,
+            "variant": self.variant,
+            "version": self.version,
+            "device": str(self.device),
+        }
+        if self.tag_trie is not None:
+            description["tag_trie"] = {"tags": self.tag_trie.num_tags, "version": self.tag_trie.version}
+        return description
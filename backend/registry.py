@@ -0,0 +1,275 @@
+import ctypes
+import gc
+import json
+import logging
+import os
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+
+WEIGHT_SUFFIXES = (".bin", ".safetensors", ".onnx", ".pt")
+
+
+class ModelSpec:
+    """One registered checkpoint: which task and language it serves, under which version label."""
+
+    __slots__ = ("task", "language", "version", "path", "quantize", "tag_trie")
+
+    def __init__(self, task, language, version, path, quantize=False, tag_trie=None):
+        self.task = task
+        self.language = language
+        self.version = version
+        self.path = path
+        self.quantize = quantize
+        self.tag_trie = tag_trie
+
+    @property
+    def key(self):
+        return (self.task, self.language, self.version)
+
+    def estimated_bytes(self):
+        """Size of the weight files on disk, a rough upper bound for what loading adds to RSS."""
+        total = 0
+        for root, _, files in os.walk(self.path):
+            total += sum(os.path.getsize(os.path.join(root, name)) for name in files if name.endswith(WEIGHT_SUFFIXES))
+        return total
+
+
+def current_rss():
+    """Resident set size of this process in bytes (0 where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def release_memory():
+    """Collect freed model objects and hand free heap pages back to the OS so RSS actually drops."""
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def release_memory_in_background():
+    threading.Thread(target=release_memory, name="release-memory", daemon=True).start()
+
+
+def load_specs(path):
+    """
+    Read registry entries from a JSON list of
+    {task, language, version, path[, quantize, tag_trie, shadow_fraction]}.
+    Returns (spec, shadow_fraction) pairs; shadow_fraction is 0 unless the
+    entry asks for its version to be shadowed before it takes traffic.
+    """
+    with open(path) as f:
+        entries = json.load(f)
+    return [
+        (ModelSpec(**{k: v for k, v in entry.items() if k != "shadow_fraction"}), float(entry.get("shadow_fraction", 0)))
+        for entry in entries
+    ]
+
+
+class ModelRegistry:
+    """
+    Maps (task, language, version) to a checkpoint and keeps a bounded set of
+    them loaded.
+
+    Each (task, language) has one active version that requests are routed
+    to. Models are loaded on first use by `loader(spec)` and kept in LRU
+    order. When loading would push the process RSS past `memory_budget`
+    bytes, the least recently used models that no request is holding are
+    evicted first. Requests hold a model between `acquire` and `release`,
+    so a batch never runs on an evicted model.
+
+    `activate` switches (task, language) to another version atomically;
+    `retire` then unloads the old one as soon as its last holder releases it.
+    """
+
+    def __init__(self, loader, memory_budget=0):
+        self.loader = loader
+        self.memory_budget = memory_budget
+        self._specs = {}
+        self._active = {}
+        self._resident = OrderedDict()
+        self._in_use = Counter()
+        self._loading = {}
+        self._retiring = set()
+        self._lock = threading.Lock()
+
+    def register(self, spec, activate=True):
+        with self._lock:
+            self._specs[spec.key] = spec
+            if activate or (spec.task, spec.language) not in self._active:
+                self._active[(spec.task, spec.language)] = spec.version
+
+    def languages(self, task):
+        return sorted(language for t, language in self._active if t == task)
+
+    def resolve(self, task, language):
+        """Key of the active version for (task, language); KeyError if none is registered."""
+        return (task, language, self._active[(task, language)])
+
+    def is_registered(self, key):
+        return key in self._specs
+
+    def spec(self, key):
+        return self._specs[key]
+
+    def get(self, key):
+        """A resident model by key; only valid while a request holds it."""
+        return self._resident[key]
+
+    def peek(self, key):
+        """The resident model for `key` without holding it, or None; only for reading what it was loaded with."""
+        with self._lock:
+            return self._resident.get(key)
+
+    def try_acquire(self, task, language):
+        """Hold the active model if it is already loaded, without blocking; None otherwise."""
+        with self._lock:
+            return self._hold(self.resolve(task, language))
+
+    def try_hold(self, key):
+        """Hold a specific version if it is loaded, without blocking; None otherwise."""
+        with self._lock:
+            return self._hold(key)
+
+    def acquire(self, task, language):
+        """Hold the active model for (task, language), loading it first if needed. Blocks while loading."""
+        return self._acquire(lambda: self.resolve(task, language))
+
+    def acquire_version(self, key):
+        """Hold a specific registered version, loading it first if needed, whether or not it is active."""
+        return self._acquire(lambda: key)
+
+    def _hold(self, key):
+        # Caller holds self._lock
+        model = self._resident.get(key)
+        if model is not None:
+            self._resident.move_to_end(key)
+            self._in_use[key] += 1
+        return model
+
+    def _acquire(self, resolve):
+        while True:
+            with self._lock:
+                # Resolved under the lock so a concurrent swap cannot hand out a retired version
+                key = resolve()
+                model = self._hold(key)
+                if model is not None:
+                    return model
+                loading = self._loading.get(key)
+                owner = loading is None
+                if owner:
+                    loading = self._loading[key] = Future()
+            if not owner:
+                # Another request is loading the same model; wait for it, then take the fast path
+                loading.result()
+                continue
+            try:
+                self._make_room(self._specs[key])
+                model = self.loader(self._specs[key])
+            except BaseException as e:
+                with self._lock:
+                    del self._loading[key]
+                loading.set_exception(e)
+                raise
+            with self._lock:
+                self._resident[key] = model
+                del self._loading[key]
+                # Retired while loading; nothing holds it yet, so it goes straight away
+                retired = key in self._retiring
+                if retired:
+                    self._drop(key)
+            loading.set_result(None)
+            if retired:
+                del model
+                release_memory_in_background()
+
+    def release(self, model):
+        dropped = False
+        with self._lock:
+            self._in_use[model.key] -= 1
+            if self._in_use[model.key] <= 0:
+                del self._in_use[model.key]
+                if model.key in self._retiring:
+                    self._drop(model.key)
+                    dropped = True
+        if dropped:
+            # Often called on the event loop; a full collection there would stall every request
+            release_memory_in_background()
+
+    def activate(self, task, language, version):
+        """Atomically route (task, language) to another registered version; returns the previous key."""
+        key = (task, language, version)
+        with self._lock:
+            if key not in self._specs:
+                raise KeyError(f"{key} is not registered")
+            previous = self._active.get((task, language))
+            self._active[(task, language)] = version
+            self._retiring.discard(key)
+        return None if previous is None else (task, language, previous)
+
+    def retire(self, key):
+        """Unload an inactive version once the requests still holding it have finished."""
+        with self._lock:
+            task, language, version = key
+            if self._active.get((task, language)) == version:
+                raise ValueError(f"{key} is active and cannot be retired")
+            if key not in self._resident:
+                if key in self._loading:
+                    # Dropped by the loading request once it lands, unless someone holds it by then
+                    self._retiring.add(key)
+                return
+            if self._in_use[key]:
+                self._retiring.add(key)
+                return
+            self._drop(key)
+        release_memory_in_background()
+
+    def _drop(self, key):
+        # Caller holds self._lock. Only unlinks the model; callers release memory once the lock is free,
+        # after this dropped the only reference so the weights can actually be freed
+        del self._resident[key]
+        self._retiring.discard(key)
+        logging.info(f"Unloaded {key}")
+
+    def resident(self):
+        return list(self._resident.values())
+
+    def _make_room(self, spec):
+        if not self.memory_budget:
+            return
+        needed = spec.estimated_bytes()
+        # Runs on a loader thread: evict one model at a time and trim outside the lock, so RSS is
+        # measured after the memory was actually handed back
+        while current_rss() + needed > self.memory_budget:
+            with self._lock:
+                victim = next((key for key in self._resident if not self._in_use[key]), None)
+                if victim is None:
+                    break
+                logging.info(f"Evicting {victim} to stay within the model memory budget")
+                self._drop(victim)
+            release_memory()
+        if current_rss() + needed > self.memory_budget:
+            logging.warning(
+                f"Loading {spec.key} (~{needed / 2**20:.0f} MiB) exceeds the model memory budget; "
+                "no other model can be evicted"
+            )
+
+    def describe(self):
+        with self._lock:
+            return {
+                "memory_budget_mb": round(self.memory_budget / 2**20),
+                "rss_mb": round(current_rss() / 2**20),
+                "active": {f"{task}/{language}": version for (task, language), version in self._active.items()},
+                "resident": [model.describe() for model in self._resident.values()],
+                "retiring": [list(key) for key in self._retiring],
+                "registered": [
+                    {"task": spec.task, "language": spec.language, "version": spec.version, "path": spec.path}
+                    for spec in self._specs.values()
+                ],
+            }
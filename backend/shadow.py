@@ -0,0 +1,61 @@
+import random
+import threading
+
+
+def _labels(result):
+    # Keyword results are {"keywords": [...], "spans": [...]}, tag results are plain lists
+    labels = result["keywords"] if isinstance(result, dict) else result
+    return {label.strip().lower() for label in labels if label.strip()}
+
+
+class ShadowComparison:
+    """
+    Running comparison of a candidate model against the active one on a
+    sampled `fraction` of live requests. The candidate's answers are never
+    returned to clients; only latency and agreement are recorded.
+    """
+
+    def __init__(self, model, fraction):
+        self.model = model
+        self.fraction = fraction
+        self.requests = 0
+        self.items = 0
+        self.failures = 0
+        self.identical = 0
+        self.overlap = 0.0
+        self.active_seconds = 0.0
+        self.candidate_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def sampled(self):
+        return random.random() < self.fraction
+
+    def record(self, active_seconds, candidate_seconds, active_results, candidate_results):
+        with self._lock:
+            self.requests += 1
+            self.active_seconds += active_seconds
+            self.candidate_seconds += candidate_seconds
+            for active, candidate in zip(active_results, candidate_results):
+                active, candidate = _labels(active), _labels(candidate)
+                self.items += 1
+                self.identical += active == candidate
+                union = active | candidate
+                self.overlap += len(active & candidate) / len(union) if union else 1.0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def describe(self):
+        with self._lock:
+            requests, items = self.requests or 1, self.items or 1
+            return {
+                "candidate": list(self.model.key),
+                "fraction": self.fraction,
+                "requests": self.requests,
+                "failures": self.failures,
+                "identical_rate": round(self.identical / items, 4),
+                "mean_jaccard": round(self.overlap / items, 4),
+                "active_ms": round(self.active_seconds / requests * 1000, 2),
+                "candidate_ms": round(self.candidate_seconds / requests * 1000, 2),
+            }
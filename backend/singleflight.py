@@ -0,0 +1,86 @@
+import asyncio
+
+
+class Flight:
+    __slots__ = ("key", "future", "result", "priority", "batcher", "waiters")
+
+    def __init__(self, key, future, priority, batcher):
+        self.key = key
+        self.future = future
+        # One asyncio view of the batcher future, shared by every waiter
+        self.result = asyncio.wrap_future(future)
+        self.priority = priority
+        self.batcher = batcher
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Identical computations in flight on this worker, keyed by result cache key.
+
+    A request whose input is already being computed waits on that computation
+    instead of queueing its own, and the one result fans out to every waiter.
+    This covers the window before the result reaches the cache, e.g. a burst
+    of retries of a request that is still decoding. A flight is only joined by
+    callers at its priority or less urgent ones, so an interactive request never
+    waits behind background work.
+
+    A waiter that is cancelled (its client disconnected or its deadline passed)
+    leaves the flight; once the last one has left, the computation is abandoned
+    in the batcher, which drops it from the queue or lets its batch stop early.
+    Must be used from the event loop thread.
+    """
+
+    def __init__(self):
+        self._flights = {}
+
+    def join(self, key, priority):
+        """The in-flight computation for `key` a caller at `priority` may wait on, or None."""
+        flight = self._flights.get(key)
+        if flight is None or flight.priority > priority or flight.future.abandoned:
+            return None
+        return flight
+
+    def start(self, key, future, priority, batcher):
+        """Register the `batcher` future computing `key`; it is forgotten once it resolves."""
+        flight = self._flights[key] = Flight(key, future, priority, batcher)
+        flight.result.add_done_callback(lambda _: self._forget(flight))
+        return flight
+
+    def wait(self, flight):
+        """
+        A future for the flight's result, counted as one waiter from now on.
+        Registered before the caller first awaits, so a request cancelled
+        early still leaves and can never keep an abandoned flight alive.
+        """
+        flight.waiters += 1
+        waiter = asyncio.get_running_loop().create_future()
+
+        def deliver(result):
+            if waiter.done():
+                return
+            if result.cancelled():
+                waiter.cancel()
+            elif result.exception() is not None:
+                waiter.set_exception(result.exception())
+            else:
+                waiter.set_result(result.result())
+
+        def leave(_):
+            flight.waiters -= 1
+            if waiter.cancelled() and not flight.waiters and not flight.result.done():
+                # Nobody is left to read the result
+                self._forget(flight)
+                flight.batcher.abandon(flight.future)
+
+        flight.result.add_done_callback(deliver)
+        waiter.add_done_callback(leave)
+        return waiter
+
+    def _forget(self, flight):
+        # A more urgent flight may have replaced this one in the meantime
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+    def __len__(self):
+        return len(self._flights)
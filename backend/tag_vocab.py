@@ -0,0 +1,246 @@
+"""
+Tag vocabulary for constrained tag decoding.
+
+Builds a token-level trie over every tag seen in the `tag` column of the
+processed news datasets (the output of `transform_csv` / `save_csv_processed`)
+and stores it as a compact, precompiled .npz file, so the API only has to
+np.load a few flat arrays at startup.
+
+    python tag_vocab.py --model ./models/best_tag_model --output ./models/tag_trie.npz
+
+The trie is tied to the tokenizer it was built with; rebuild it whenever the
+tag model's tokenizer changes. Tags are grouped case-insensitively and the most
+frequent spelling of each group is kept, so near-duplicates collapse into one
+entry; `--min-count` additionally drops rare (often misspelled) tags.
+"""
+import argparse
+import hashlib
+import logging
+import os
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import numpy as np
+
+from config import TAG_MODEL_PATH, TAG_TRIE_PATH
+
+TAG_SOURCES = ["kompas", "tempo", "mojok", "medium"]
+
+
+class TagTrie:
+    """
+    Token trie over known tags, flattened breadth-first into arrays.
+
+    Node 0 is the root. The children of node n are the nodes
+    `child_start[n] : child_start[n] + child_count[n]`, sorted by
+    `tokens` (the token id on the edge into each node), and `terminal[n]`
+    marks nodes where a complete tag ends. `separator` is the token sequence
+    the model emits between two tags (e.g. the ids of ",").
+    """
+
+    def __init__(self, tokens, child_start, child_count, terminal, separator, vocab_size, version):
+        self.tokens = tokens
+        self.child_start = child_start
+        self.child_count = child_count
+        self.terminal = terminal
+        self.separator = [int(token) for token in separator]
+        self.vocab_size = int(vocab_size)
+        self.version = str(version)
+        self.eos_token_id = None
+        self.pad_token_id = None
+
+    @property
+    def num_tags(self):
+        return int(self.terminal.sum())
+
+    @classmethod
+    def build(cls, tokenizer, tags):
+        root = {}
+        ends = set()
+        for tag in tags:
+            node = root
+            for token in tokenizer(tag, add_special_tokens=False)["input_ids"]:
+                node = node.setdefault(token, {})
+            ends.add(id(node))
+
+        tokens, child_start, child_count, terminal = [-1], [], [], [False]
+        queue = [root]
+        for node in queue:
+            child_start.append(len(tokens))
+            child_count.append(len(node))
+            for token in sorted(node):
+                tokens.append(token)
+                terminal.append(id(node[token]) in ends)
+                queue.append(node[token])
+
+        arrays = {
+            "tokens": np.array(tokens, dtype=np.int32),
+            "child_start": np.array(child_start, dtype=np.int32),
+            "child_count": np.array(child_count, dtype=np.int32),
+            "terminal": np.array(terminal, dtype=bool),
+        }
+        digest = hashlib.sha256()
+        for array in arrays.values():
+            digest.update(array.tobytes())
+        return cls(
+            separator=separator_tokens(tokenizer),
+            vocab_size=len(tokenizer),
+            version=digest.hexdigest()[:16],
+            **arrays,
+        )
+
+    def save(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                tokens=self.tokens,
+                child_start=self.child_start,
+                child_count=self.child_count,
+                terminal=self.terminal,
+                separator=np.array(self.separator, dtype=np.int32),
+                vocab_size=self.vocab_size,
+                version=self.version,
+            )
+
+    @classmethod
+    def load(cls, path, tokenizer):
+        with np.load(path) as data:
+            trie = cls(**{name: data[name] for name in data.files})
+        if trie.vocab_size != len(tokenizer):
+            raise ValueError(
+                f"Tag trie {path} was built for a vocabulary of {trie.vocab_size} tokens, "
+                f"but the tag tokenizer has {len(tokenizer)}; rebuild it with tag_vocab.py"
+            )
+        trie.eos_token_id = tokenizer.eos_token_id
+        trie.pad_token_id = tokenizer.pad_token_id
+        return trie
+
+    def _children(self, node):
+        start = self.child_start[node]
+        return self.tokens[start:start + self.child_count[node]]
+
+    def _child(self, node, token):
+        children = self._children(node)
+        i = int(np.searchsorted(children, token))
+        if i < len(children) and children[i] == token:
+            return int(self.child_start[node]) + i
+        return None
+
+    def allowed_tokens(self, generated):
+        """
+        Token ids that may follow `generated` (decoder output without the start
+        token): the next token of a known tag, or, once a tag is complete, the
+        separator or EOS.
+        """
+        eos = self.eos_token_id
+        node, in_separator = 0, 0
+        for token in generated:
+            if token == eos:
+                return [self.pad_token_id if self.pad_token_id is not None else eos]
+            if in_separator:
+                in_separator = in_separator + 1 if token == self.separator[in_separator] else 0
+                if in_separator == len(self.separator):
+                    node, in_separator = 0, 0
+                continue
+            child = self._child(node, token)
+            if child is not None:
+                node = child
+            elif self.terminal[node] and token == self.separator[0]:
+                if len(self.separator) == 1:
+                    node = 0
+                else:
+                    in_separator = 1
+            else:
+                # Off the trie (e.g. forced tokens); let the sequence end
+                return [eos]
+        if in_separator:
+            return [self.separator[in_separator]]
+        allowed = self._children(node).tolist()
+        if self.terminal[node]:
+            allowed += [self.separator[0], eos]
+        return allowed or [eos]
+
+    def prefix_allowed_tokens_fn(self):
+        def allowed(batch_id, input_ids):
+            # input_ids[0] is the decoder start token
+            return self.allowed_tokens(input_ids[1:].tolist())
+        return allowed
+
+
+def separator_tokens(tokenizer):
+    """Token ids the tokenizer produces between two tags in a "tag, tag" string."""
+    first = tokenizer("x", add_special_tokens=False)["input_ids"]
+    second = tokenizer("y", add_special_tokens=False)["input_ids"]
+    joined = tokenizer("x, y", add_special_tokens=False)["input_ids"]
+    if joined[:len(first)] != first or joined[-len(second):] != second:
+        raise ValueError("Could not isolate the tag separator tokens for this tokenizer")
+    return joined[len(first):len(joined) - len(second)]
+
+
+def load_tag_trie(path, tokenizer):
+    """
+    Load the precompiled tag trie for `tokenizer`, or return None when no file
+    is configured or present, or when it was built for another tokenizer.
+    """
+    if not path or not os.path.exists(path):
+        logging.info(f"No tag trie at {path!r}; constrained tag decoding is disabled")
+        return None
+    try:
+        trie = TagTrie.load(path, tokenizer)
+    except ValueError as e:
+        # A stale trie only costs constrained decoding (422), not the whole tag model
+        logging.warning(f"{e}; constrained tag decoding is disabled")
+        return None
+    logging.info(f"Loaded tag trie {path} ({trie.num_tags} tags, version {trie.version})")
+    return trie
+
+
+def collect_tags(data_dir, sources, min_count):
+    """Count tags across sources and keep the most frequent spelling of each case-insensitive group."""
+    # Offline only; the API imports this module just for TagTrie
+    import pandas as pd
+
+    spellings = defaultdict(Counter)
+    for source in sources:
+        csv_path = Path(data_dir) / f"{source}.csv"
+        if not csv_path.exists():
+            print(f"[WARN] {csv_path} tidak ditemukan, dilewati.")
+            continue
+        df = pd.read_csv(csv_path, usecols=["tag"]).dropna()
+        for value in df["tag"]:
+            for tag in str(value).split(","):
+                tag = " ".join(tag.split())
+                if tag:
+                    spellings[tag.lower()][tag] += 1
+        print(f"[INFO] {source}: {len(df)} baris dibaca")
+    return [
+        counts.most_common(1)[0][0]
+        for counts in spellings.values()
+        if sum(counts.values()) >= min_count
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bangun trie kosakata tag untuk constrained decoding.")
+    parser.add_argument("--model", default=TAG_MODEL_PATH, help="Checkpoint model tag (untuk tokenizer)")
+    parser.add_argument("--data-dir", default="../data/processed")
+    parser.add_argument("--sources", nargs="+", default=TAG_SOURCES)
+    parser.add_argument("--min-count", type=int, default=2, help="Frekuensi minimum sebuah tag")
+    parser.add_argument("--output", default=TAG_TRIE_PATH or "./models/tag_trie.npz")
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+
+    tags = collect_tags(args.data_dir, args.sources, args.min_count)
+    if not tags:
+        print("[ERROR] Tidak ada tag yang ditemukan.")
+        return
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    trie = TagTrie.build(tokenizer, tags)
+    trie.save(args.output)
+    print(f"[INFO] {trie.num_tags} tag, {len(trie.tokens)} node disimpan ke {args.output}")
+
+
+if __name__ == "__main__":
+    main()
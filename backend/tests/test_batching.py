@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+
+from batching import BACKGROUND, INTERACTIVE, MicroBatcher, Overloaded
+
+TIMEOUT = 5
+
+
+class BlockingBatches:
+    """Batch function that records every batch and holds the first one until released."""
+
+    def __init__(self):
+        self.batches = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, items, key, timings, abandoned):
+        self.batches.append(list(items))
+        self.started.set()
+        assert self.release.wait(TIMEOUT)
+        return [item.upper() for item in items]
+
+
+def blocked_batcher(**options):
+    """A batcher whose worker is busy with a first batch, so later submissions stay queued."""
+    batch_fn = BlockingBatches()
+    batcher = MicroBatcher("test", batch_fn, max_wait_ms=0, **options)
+    first = batcher.submit("first")
+    assert batch_fn.started.wait(TIMEOUT)
+    return batcher, batch_fn, first
+
+
+def test_interactive_batches_run_before_earlier_background_work():
+    batcher, batch_fn, first = blocked_batcher(max_batch_size=8)
+    background = batcher.submit_many(["b1", "b2"], priority=BACKGROUND)
+    interactive = batcher.submit_many(["i1", "i2"], priority=INTERACTIVE)
+    batch_fn.release.set()
+
+    assert [future.result(TIMEOUT) for future in interactive + background] == ["I1", "I2", "B1", "B2"]
+    # Never mixed, most urgent first
+    assert batch_fn.batches == [["first"], ["i1", "i2"], ["b1", "b2"]]
+    assert first.result(TIMEOUT) == "FIRST"
+
+
+def test_batches_never_mix_keys():
+    batcher, batch_fn, _ = blocked_batcher(max_batch_size=8)
+    futures = batcher.submit_many(["a1", "a2"], key="a") + batcher.submit_many(["b1"], key="b")
+    batch_fn.release.set()
+
+    assert [future.result(TIMEOUT) for future in futures] == ["A1", "A2", "B1"]
+    assert batch_fn.batches[1:] == [["a1", "a2"], ["b1"]]
+
+
+def test_queued_background_work_does_not_reject_interactive_requests():
+    batcher, batch_fn, _ = blocked_batcher(max_queue=2)
+    batcher.submit_many(["b1", "b2"], priority=BACKGROUND)
+    with pytest.raises(Overloaded) as rejected:
+        batcher.submit("b3", priority=BACKGROUND)
+    assert rejected.value.status_code == 429
+
+    interactive = batcher.submit("i1")
+    assert batcher.queue_depth(INTERACTIVE) == 1
+    assert batcher.queue_depth() == 3
+    batch_fn.release.set()
+    assert interactive.result(TIMEOUT) == "I1"
+
+
+def test_abandoned_item_is_dropped_from_the_queue():
+    batcher, batch_fn, _ = blocked_batcher(max_batch_size=8)
+    kept, dropped = batcher.submit_many(["kept", "dropped"])
+    batcher.abandon(dropped)
+    assert dropped.cancelled()
+    assert batcher.queue_depth() == 1
+    batch_fn.release.set()
+
+    assert kept.result(TIMEOUT) == "KEPT"
+    assert batch_fn.batches[1:] == [["kept"]]
+
+
+def test_abandoning_the_only_item_during_the_batch_window_keeps_the_worker_alive():
+    batch_fn = BlockingBatches()
+    batch_fn.release.set()
+    batcher = MicroBatcher("test", batch_fn, max_batch_size=8, max_wait_ms=100)
+    dropped = batcher.submit("dropped")
+    # The worker is now waiting out the batch window for it
+    time.sleep(0.02)
+    batcher.abandon(dropped)
+    # Let the window the worker was waiting out expire on an empty queue
+    time.sleep(0.15)
+    assert batcher._thread.is_alive()
+
+    assert batcher.submit("next").result(TIMEOUT) == "NEXT"
+    assert batch_fn.batches == [["next"]]
+
+def test_empty_submission_is_admitted_under_a_full_queue():
+    batcher, batch_fn, _ = blocked_batcher(max_queue=1)
+    batcher.submit("queued")
+    with pytest.raises(Overloaded):
+        batcher.submit("rejected")
+    assert batcher.submit_many([]) == []
+    batch_fn.release.set()
@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+
+from cancellation import CancelAbandonedRequests
+
+
+def cancelled_count(reason):
+    return REGISTRY.get_sample_value("text2tag_cancelled_requests_total", {"reason": reason}) or 0
+
+
+class Client:
+    """One request's `receive`/`send` pair; `hang_up()` makes the next receive after the body a disconnect."""
+
+    def __init__(self):
+        self.sent = []
+        self.body_sent = False
+        self.disconnect = asyncio.Event()
+
+    async def receive(self):
+        if not self.body_sent:
+            self.body_sent = True
+            return {"type": "http.request", "body": b"{}", "more_body": False}
+        await self.disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    def hang_up(self):
+        self.disconnect.set()
+
+    @property
+    def status(self):
+        starts = [message["status"] for message in self.sent if message["type"] == "http.response.start"]
+        return starts[0] if starts else None
+
+
+def scope(deadline=None):
+    headers = [] if deadline is None else [(b"x-request-deadline", str(deadline).encode())]
+    return {"type": "http", "headers": headers}
+
+
+class SlowApp:
+    """Reads the body, then waits until cancelled or `finish` is set."""
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.finish = asyncio.Event()
+        self.cancelled = False
+
+    async def __call__(self, scope, receive, send):
+        await receive()
+        self.started.set()
+        try:
+            await self.finish.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+def test_completed_request_passes_through():
+    async def scenario():
+        app, client = SlowApp(), Client()
+        app.finish.set()
+        await CancelAbandonedRequests(app)(scope(time.time() + 60), client.receive, client.send)
+        assert client.status == 200
+        assert not app.cancelled
+
+    asyncio.run(scenario())
+
+
+def test_passed_deadline_is_answered_with_504_without_running_the_handler():
+    async def scenario():
+        app, client = SlowApp(), Client()
+        before = cancelled_count("deadline")
+        await CancelAbandonedRequests(app)(scope(time.time() - 1), client.receive, client.send)
+        assert client.status == 504
+        assert not app.started.is_set()
+        assert cancelled_count("deadline") == before + 1
+
+    asyncio.run(scenario())
+
+
+def test_deadline_passing_mid_request_cancels_the_handler_with_504():
+    async def scenario():
+        app, client = SlowApp(), Client()
+        before = cancelled_count("deadline")
+        await CancelAbandonedRequests(app)(scope(time.time() + 0.05), client.receive, client.send)
+        assert app.cancelled
+        assert client.status == 504
+        assert cancelled_count("deadline") == before + 1
+
+    asyncio.run(scenario())
+
+
+def test_disconnect_cancels_the_handler_and_sends_nothing():
+    async def scenario():
+        app, client = SlowApp(), Client()
+        before = cancelled_count("disconnect")
+        request = asyncio.ensure_future(CancelAbandonedRequests(app)(scope(), client.receive, client.send))
+        await app.started.wait()
+        client.hang_up()
+        await asyncio.wait_for(request, 5)
+        assert app.cancelled
+        assert client.sent == []
+        assert cancelled_count("disconnect") == before + 1
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("deadline", ["soon", "nan", "inf", "-inf"])
+def test_invalid_deadline_is_rejected_with_400(deadline):
+    async def scenario():
+        app, client = SlowApp(), Client()
+        await CancelAbandonedRequests(app)(scope(deadline), client.receive, client.send)
+        assert client.status == 400
+        assert not app.started.is_set()
+
+    asyncio.run(scenario())
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+# inference imports torch and transformers at module level
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from inference import bio_spans, keyword_result, merge_spans
+
+O, B, I = 0, 1, 2
+# Unlabelled positions: special tokens ([CLS], [SEP]) and padding
+X = None
+
+
+def decode(*rows):
+    """bio_spans over label rows padded to one length; X marks positions that are not valid."""
+    width = max(len(row) for row in rows)
+    predictions = np.full((len(rows), width), O)
+    valid = np.zeros((len(rows), width), dtype=bool)
+    for r, row in enumerate(rows):
+        for position, label in enumerate(row):
+            if label is not X:
+                predictions[r, position] = label
+                valid[r, position] = True
+    spans = bio_spans(predictions, valid)
+    return [tuple(int(value) for value in span) for span in zip(*spans)]
+
+
+@pytest.mark.parametrize(
+    "rows, expected",
+    [
+        (([O, B, I, I, O],), [(0, 1, 3)]),
+        (([B, O, B],), [(0, 0, 0), (0, 2, 2)]),
+        # A span may run to the last position
+        (([O, B, I],), [(0, 1, 2)]),
+        # I-KEY with no open span is ignored, also after a span closed
+        (([O, I, I, O],), []),
+        (([B, O, I, B, I],), [(0, 0, 0), (0, 3, 4)]),
+        # B-KEY always starts a new span
+        (([B, B, I, B],), [(0, 0, 0), (0, 1, 2), (0, 3, 3)]),
+        # Special tokens and padding never belong to a span, even when labelled
+        (([X, B, I, X, X],), [(0, 1, 2)]),
+        (([B, X, I],), [(0, 0, 0)]),
+        # Rows are decoded independently and returned in row-major order
+        (([O, B, I], [B, I, X], [X, X, X]), [(0, 1, 2), (1, 0, 1)]),
+        (([I, B], [B, O]), [(0, 1, 1), (1, 0, 0)]),
+    ],
+)
+def test_bio_spans(rows, expected):
+    assert decode(*rows) == expected
+
+
+@pytest.mark.parametrize(
+    "spans, expected",
+    [
+        ([], []),
+        ([(0, 5)], [[0, 5]]),
+        # The same keyword found by two overlapping windows
+        ([(10, 20), (10, 20)], [[10, 20]]),
+        ([(12, 30), (10, 20)], [[10, 30]]),
+        ([(0, 8), (4, 6)], [[0, 8]]),
+        # Adjacent spans stay separate keywords
+        ([(0, 5), (5, 9)], [[0, 5], [5, 9]]),
+        ([(20, 25), (0, 3), (2, 4)], [[0, 4], [20, 25]]),
+    ],
+)
+def test_merge_spans(spans, expected):
+    assert merge_spans(spans) == expected
+
+
+def test_keyword_result_keeps_first_surface_form_and_every_span():
+    text = "Machine learning dan machine learning lagi"
+    result = keyword_result(text, [[0, 16], [21, 37]])
+    assert result["keywords"] == ["Machine learning"]
+    assert result["spans"] == [
+        {"text": "Machine learning", "start": 0, "end": 16},
+        {"text": "machine learning", "start": 21, "end": 37},
+    ]
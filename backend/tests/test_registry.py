@@ -0,0 +1,104 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import registry as registry_module
+from registry import ModelRegistry, ModelSpec
+
+TIMEOUT = 5
+
+
+class FakeModel:
+    def __init__(self, key):
+        self.key = key
+
+
+class CountingLoader:
+    """Loader that counts loads per key and can hold a load until released."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.loads = []
+        self.gates = {}
+
+    def __call__(self, spec):
+        self.loads.append(spec.key)
+        gate = self.gates.get(spec.key)
+        if gate is not None:
+            assert gate.wait(TIMEOUT)
+        time.sleep(self.delay)
+        return FakeModel(spec.key)
+
+
+def make_registry(loader, memory_budget=0, versions=("v1",)):
+    models = ModelRegistry(loader, memory_budget)
+    for version in versions:
+        models.register(ModelSpec("tag", "id", version, f"/models/{version}"), activate=version == versions[0])
+    return models
+
+
+def test_concurrent_acquires_load_once():
+    loader = CountingLoader(delay=0.05)
+    models = make_registry(loader)
+    with ThreadPoolExecutor(8) as pool:
+        held = list(pool.map(lambda _: models.acquire("tag", "id"), range(8)))
+
+    assert loader.loads == [("tag", "id", "v1")]
+    assert all(model is held[0] for model in held)
+    for model in held:
+        models.release(model)
+    assert not models._in_use
+
+
+def test_retire_waits_for_the_last_release():
+    models = make_registry(CountingLoader(), versions=("v1", "v2"))
+    first, second = models.acquire("tag", "id"), models.acquire("tag", "id")
+    models.activate("tag", "id", "v2")
+    models.retire(("tag", "id", "v1"))
+
+    assert models.peek(("tag", "id", "v1")) is first
+    models.release(first)
+    assert models.peek(("tag", "id", "v1")) is second
+    models.release(second)
+    assert models.peek(("tag", "id", "v1")) is None
+
+
+def test_make_room_never_evicts_a_held_model(monkeypatch):
+    # Always over budget, so every model nobody holds is a candidate
+    monkeypatch.setattr(registry_module, "current_rss", lambda: 2**40)
+    monkeypatch.setattr(registry_module, "release_memory", lambda: None)
+    monkeypatch.setattr(ModelSpec, "estimated_bytes", lambda spec: 0)
+    models = ModelRegistry(CountingLoader(), memory_budget=1)
+    for language in ("id", "en", "ms"):
+        models.register(ModelSpec("tag", language, "v1", f"/models/{language}"))
+
+    held = models.acquire("tag", "id")
+    models.release(models.acquire("tag", "en"))
+    loaded = models.acquire("tag", "ms")
+
+    assert models.peek(held.key) is held
+    assert models.peek(("tag", "en", "v1")) is None
+    assert models.peek(loaded.key) is loaded
+    models.release(held)
+    models.release(loaded)
+
+
+def test_activate_during_a_load_never_hands_out_the_retired_version():
+    loader = CountingLoader()
+    models = make_registry(loader, versions=("v1", "v2"))
+    loader.gates[("tag", "id", "v1")] = gate = threading.Event()
+    with ThreadPoolExecutor(1) as pool:
+        pending = pool.submit(models.acquire, "tag", "id")
+        while ("tag", "id", "v1") not in loader.loads:
+            time.sleep(0.001)
+        # The old version is still loading when traffic moves on
+        models.activate("tag", "id", "v2")
+        models.retire(("tag", "id", "v1"))
+        gate.set()
+        model = pending.result(TIMEOUT)
+
+    assert model.key == ("tag", "id", "v2")
+    # The load that finished after the retire does not leave the old version behind
+    assert models.peek(("tag", "id", "v1")) is None
+    models.release(model)
+    assert models.acquire("tag", "id").key == ("tag", "id", "v2")
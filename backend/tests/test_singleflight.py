@@ -0,0 +1,108 @@
+import asyncio
+from concurrent.futures import Future
+
+import pytest
+
+from batching import BACKGROUND, INTERACTIVE
+from singleflight import SingleFlight
+
+
+class FakeBatcher:
+    def __init__(self):
+        self.abandoned = []
+
+    def abandon(self, future):
+        future.abandoned = True
+        self.abandoned.append(future)
+
+
+def batcher_future():
+    future = Future()
+    future.abandoned = False
+    return future
+
+
+def run(coroutine):
+    return asyncio.run(coroutine())
+
+
+def test_result_fans_out_to_every_waiter():
+    async def scenario():
+        flights, batcher, future = SingleFlight(), FakeBatcher(), batcher_future()
+        flight = flights.start("key", future, INTERACTIVE, batcher)
+        waiters = [flights.wait(flight), flights.wait(flights.join("key", INTERACTIVE))]
+        future.set_result(["tag"])
+        assert await asyncio.gather(*waiters) == [["tag"], ["tag"]]
+        await asyncio.sleep(0)
+        assert len(flights) == 0
+        assert batcher.abandoned == []
+
+    run(scenario)
+
+
+def test_abandoned_only_when_last_waiter_leaves():
+    async def scenario():
+        flights, batcher, future = SingleFlight(), FakeBatcher(), batcher_future()
+        flight = flights.start("key", future, INTERACTIVE, batcher)
+        first, second = flights.wait(flight), flights.wait(flight)
+
+        first.cancel()
+        await asyncio.sleep(0)
+        assert batcher.abandoned == []
+        assert flights.join("key", INTERACTIVE) is flight
+
+        second.cancel()
+        await asyncio.sleep(0)
+        assert batcher.abandoned == [future]
+        assert flights.join("key", INTERACTIVE) is None
+        assert len(flights) == 0
+
+    run(scenario)
+
+
+def test_waiter_cancelled_before_first_await_still_leaves():
+    async def scenario():
+        flights, batcher, future = SingleFlight(), FakeBatcher(), batcher_future()
+        waiter = flights.wait(flights.start("key", future, INTERACTIVE, batcher))
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await asyncio.sleep(0)
+        assert batcher.abandoned == [future]
+
+    run(scenario)
+
+
+def test_failure_reaches_every_waiter():
+    async def scenario():
+        flights, batcher, future = SingleFlight(), FakeBatcher(), batcher_future()
+        flight = flights.start("key", future, INTERACTIVE, batcher)
+        waiters = [flights.wait(flight), flights.wait(flight)]
+        future.set_exception(RuntimeError("batch failed"))
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+        assert batcher.abandoned == []
+
+    run(scenario)
+
+
+def test_interactive_never_joins_background_flight():
+    async def scenario():
+        flights, batcher = SingleFlight(), FakeBatcher()
+        flights.start("background", batcher_future(), BACKGROUND, batcher)
+        interactive = flights.start("interactive", batcher_future(), INTERACTIVE, batcher)
+        assert flights.join("background", INTERACTIVE) is None
+        assert flights.join("background", BACKGROUND) is not None
+        assert flights.join("interactive", BACKGROUND) is interactive
+
+    run(scenario)
+
+
+def test_abandoned_flight_is_not_joined():
+    async def scenario():
+        flights, batcher, future = SingleFlight(), FakeBatcher(), batcher_future()
+        flights.start("key", future, INTERACTIVE, batcher)
+        future.abandoned = True
+        assert flights.join("key", INTERACTIVE) is None
+
+    run(scenario)